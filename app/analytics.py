@@ -0,0 +1,296 @@
+import argparse
+import os
+from datetime import datetime
+from datetime import timedelta
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import sessionmaker
+
+from app.config import ARCHIVE_DATABASE_URL
+from app.database import SessionLocal
+from app.database import build_engine
+from app.database import engine
+from app.database import prepare_schema
+from app.models import AnalyticsBlueprintTotal
+from app.models import AnalyticsDailyTotal
+from app.models import AnalyticsDailyUser
+from app.models import CollectionCycle
+from app.models import CycleBlueprint
+from app.models import CycleRun
+from app.models import FocusCompletionRecord
+from app.models import FocusTaskRecord
+from app.models import PrunedRunTotal
+from app.models import RewardEntitlement
+
+
+DEFAULT_ANALYTICS_DAYS = 30
+MAX_ANALYTICS_DAYS = 366
+BLUEPRINT_LIMIT = 20
+# activity_date is the user's local date; the furthest-ahead zone (UTC+14) is already on the next day.
+LATEST_UTC_OFFSET = timedelta(hours=14)
+BLUEPRINT_COUNTERS = ("runs_started", "runs_completed", "runs_stopped", "trial_runs", "trial_rewards", "trial_claims")
+DAILY_COUNTERS = ("active_users", "focus_count", "task_count")
+RUN_STATUS_COUNTERS = {"completed": "runs_completed", "stopped": "runs_stopped"}
+UPSERT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def upsert(db: Session, model):
+    return UPSERT_INSERTS[db.get_bind().dialect.name](model.__table__)
+
+
+def bump(db: Session, model, key: dict, changes: dict):
+    changes = dict((name, value) for name, value in changes.items() if value)
+    if not changes:
+        return
+    row = dict(key)
+    row.update(changes)
+    table = model.__table__
+    db.execute(upsert(db, model).values(**row).on_conflict_do_update(
+        index_elements=list(key),
+        set_=dict((name, table.c[name] + value) for name, value in changes.items()),
+    ))
+
+
+def record_run_started(db: Session, run):
+    bump(
+        db,
+        AnalyticsBlueprintTotal,
+        {"cycle_blueprint_id": run.cycle_blueprint_id},
+        {"runs_started": 1, "trial_runs": 1 if run.cycle_mode == "trial" else 0},
+    )
+
+
+def record_run_status(db: Session, run, previous_status: str):
+    if previous_status == run.status:
+        return
+    changes = {}
+    if previous_status in RUN_STATUS_COUNTERS:
+        changes[RUN_STATUS_COUNTERS[previous_status]] = -1
+    if run.status in RUN_STATUS_COUNTERS:
+        changes[RUN_STATUS_COUNTERS[run.status]] = 1
+    bump(db, AnalyticsBlueprintTotal, {"cycle_blueprint_id": run.cycle_blueprint_id}, changes)
+
+
+def record_trial_reward(db: Session, run):
+    if run.cycle_mode == "trial":
+        bump(db, AnalyticsBlueprintTotal, {"cycle_blueprint_id": run.cycle_blueprint_id}, {"trial_rewards": 1})
+
+
+def record_trial_claim(db: Session, run):
+    if run.cycle_mode == "trial":
+        bump(db, AnalyticsBlueprintTotal, {"cycle_blueprint_id": run.cycle_blueprint_id}, {"trial_claims": 1})
+
+
+def record_focus(db: Session, user_id: int, activity_date: str, task_count: int):
+    first_today = db.execute(
+        upsert(db, AnalyticsDailyUser).values(activity_date=activity_date, user_id=user_id).on_conflict_do_nothing()
+    ).rowcount == 1
+    bump(
+        db,
+        AnalyticsDailyTotal,
+        {"activity_date": activity_date},
+        {"active_users": 1 if first_today else 0, "focus_count": 1, "task_count": task_count},
+    )
+
+
+def open_archive_session(url: str = ARCHIVE_DATABASE_URL):
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and (not parsed.database or not os.path.exists(parsed.database)):
+        return None
+    return sessionmaker(bind=build_engine(url))()
+
+
+def compute_aggregates(db: Session, archive_db: Session = None):
+    daily_users = set()
+    daily = {}
+    blueprints = {}
+    trial_run_ids = set()
+
+    def blueprint_row(blueprint_id):
+        return blueprints.setdefault(blueprint_id, dict((name, 0) for name in BLUEPRINT_COUNTERS))
+
+    def daily_row(day):
+        return daily.setdefault(day, dict((name, 0) for name in DAILY_COUNTERS))
+
+    def count_runs(blueprint_id, status, mode, count):
+        row = blueprint_row(blueprint_id)
+        row["runs_started"] += count
+        if status in RUN_STATUS_COUNTERS:
+            row[RUN_STATUS_COUNTERS[status]] += count
+        if mode == "trial":
+            row["trial_runs"] += count
+
+    for source in [session for session in (db, archive_db) if session is not None]:
+        daily_users.update(
+            source.query(FocusCompletionRecord.local_date, CycleRun.user_id).join(
+                CycleRun, FocusCompletionRecord.run_id == CycleRun.id
+            ).filter(FocusCompletionRecord.local_date.isnot(None)).distinct().all()
+        )
+        for day, count in source.query(FocusCompletionRecord.local_date, func.count(FocusCompletionRecord.id)).filter(
+            FocusCompletionRecord.local_date.isnot(None)
+        ).group_by(FocusCompletionRecord.local_date):
+            daily_row(day)["focus_count"] += count
+        for day, count in source.query(FocusCompletionRecord.local_date, func.count(FocusTaskRecord.id)).join(
+            FocusTaskRecord, FocusTaskRecord.focus_completion_record_id == FocusCompletionRecord.id
+        ).filter(FocusCompletionRecord.local_date.isnot(None)).group_by(FocusCompletionRecord.local_date):
+            daily_row(day)["task_count"] += count
+        for blueprint_id, status, mode, count in source.query(
+            CycleRun.cycle_blueprint_id, CycleRun.status, CycleRun.cycle_mode, func.count(CycleRun.id)
+        ).group_by(CycleRun.cycle_blueprint_id, CycleRun.status, CycleRun.cycle_mode):
+            count_runs(blueprint_id, status, mode, count)
+        for blueprint_id, count in source.query(CycleRun.cycle_blueprint_id, func.count(RewardEntitlement.id)).join(
+            CycleRun, RewardEntitlement.run_id == CycleRun.id
+        ).filter(CycleRun.cycle_mode == "trial").group_by(CycleRun.cycle_blueprint_id):
+            blueprint_row(blueprint_id)["trial_rewards"] += count
+        trial_run_ids.update(row[0] for row in source.query(CycleRun.id).filter(CycleRun.cycle_mode == "trial"))
+
+    for blueprint_id, status, mode, count in db.query(
+        PrunedRunTotal.cycle_blueprint_id, PrunedRunTotal.status, PrunedRunTotal.cycle_mode, PrunedRunTotal.run_count
+    ):
+        count_runs(blueprint_id, status, mode, count)
+    for blueprint_id, source_run_id in db.query(CollectionCycle.cycle_blueprint_id, CollectionCycle.source_run_id):
+        if source_run_id in trial_run_ids:
+            blueprint_row(blueprint_id)["trial_claims"] += 1
+    for day, user_id in daily_users:
+        daily_row(day)["active_users"] += 1
+    return daily, blueprints, daily_users
+
+
+def stored_aggregates(db: Session):
+    daily = dict(
+        (row.activity_date, dict((name, getattr(row, name)) for name in DAILY_COUNTERS))
+        for row in db.query(AnalyticsDailyTotal)
+    )
+    blueprints = dict(
+        (row.cycle_blueprint_id, dict((name, getattr(row, name)) for name in BLUEPRINT_COUNTERS))
+        for row in db.query(AnalyticsBlueprintTotal)
+    )
+    return daily, blueprints
+
+
+def rebuild_analytics(db: Session, archive_db: Session = None) -> dict:
+    daily, blueprints, daily_users = compute_aggregates(db, archive_db)
+    db.query(AnalyticsDailyUser).delete(synchronize_session=False)
+    db.query(AnalyticsDailyTotal).delete(synchronize_session=False)
+    db.query(AnalyticsBlueprintTotal).delete(synchronize_session=False)
+    db.bulk_insert_mappings(
+        AnalyticsDailyUser,
+        [{"activity_date": day, "user_id": user_id} for day, user_id in daily_users],
+    )
+    db.bulk_insert_mappings(AnalyticsDailyTotal, [dict(row, activity_date=day) for day, row in daily.items()])
+    db.bulk_insert_mappings(
+        AnalyticsBlueprintTotal,
+        [dict(row, cycle_blueprint_id=blueprint_id) for blueprint_id, row in blueprints.items()],
+    )
+    db.commit()
+    return {"days": len(daily), "blueprints": len(blueprints), "dailyUsers": len(daily_users)}
+
+
+def verify_analytics(db: Session, archive_db: Session = None) -> list:
+    expected_daily, expected_blueprints, _ = compute_aggregates(db, archive_db)
+    stored_daily, stored_blueprints = stored_aggregates(db)
+    differences = []
+    for label, expected, stored in (
+        ("day", expected_daily, stored_daily),
+        ("blueprint", expected_blueprints, stored_blueprints),
+    ):
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key) != stored.get(key):
+                differences.append({label: key, "expected": expected.get(key), "stored": stored.get(key)})
+    return differences
+
+
+def ensure_analytics(db: Session):
+    if db.query(AnalyticsBlueprintTotal.id).first() or not db.query(CycleRun.id).first():
+        return
+    archive_db = open_archive_session()
+    try:
+        rebuild_analytics(db, archive_db)
+    finally:
+        if archive_db is not None:
+            archive_db.close()
+
+
+def ratio(numerator: int, denominator: int):
+    return round(numerator / float(denominator), 4) if denominator else None
+
+
+def analytics_overview(db: Session, days: int = DEFAULT_ANALYTICS_DAYS, limit: int = BLUEPRINT_LIMIT) -> dict:
+    end = (datetime.utcnow() + LATEST_UTC_OFFSET).date()
+    start = end - timedelta(days=days - 1)
+    daily_rows = db.query(AnalyticsDailyTotal).filter(
+        AnalyticsDailyTotal.activity_date >= start.isoformat(),
+        AnalyticsDailyTotal.activity_date <= end.isoformat(),
+    ).order_by(AnalyticsDailyTotal.activity_date).all()
+    focus_total = sum(row.focus_count for row in daily_rows)
+    task_total = sum(row.task_count for row in daily_rows)
+    blueprint_rows = db.query(AnalyticsBlueprintTotal, CycleBlueprint.name).join(
+        CycleBlueprint, AnalyticsBlueprintTotal.cycle_blueprint_id == CycleBlueprint.id
+    ).order_by(AnalyticsBlueprintTotal.runs_started.desc(), AnalyticsBlueprintTotal.cycle_blueprint_id).limit(limit).all()
+    trial_rewards, trial_claims = db.query(
+        func.coalesce(func.sum(AnalyticsBlueprintTotal.trial_rewards), 0),
+        func.coalesce(func.sum(AnalyticsBlueprintTotal.trial_claims), 0),
+    ).one()
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "dailyActiveFocusers": [
+            {
+                "date": row.activity_date,
+                "activeUsers": row.active_users,
+                "focusCount": row.focus_count,
+                "taskCount": row.task_count,
+            }
+            for row in daily_rows
+        ],
+        "averageTasksPerFocus": ratio(task_total, focus_total),
+        "blueprints": [
+            {
+                "id": row.cycle_blueprint_id,
+                "name": name,
+                "runsStarted": row.runs_started,
+                "runsCompleted": row.runs_completed,
+                "runsStopped": row.runs_stopped,
+                "completionRate": ratio(row.runs_completed, row.runs_started),
+            }
+            for row, name in blueprint_rows
+        ],
+        "trialConversion": {
+            "rewards": trial_rewards,
+            "claims": trial_claims,
+            "rate": ratio(trial_claims, trial_rewards),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild or verify the admin analytics aggregates.")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args()
+    prepare_schema(engine)
+    db = SessionLocal()
+    archive_db = open_archive_session()
+    try:
+        if args.command == "rebuild":
+            print("rebuilt {days} days, {blueprints} blueprints, {dailyUsers} daily users".format(
+                **rebuild_analytics(db, archive_db)
+            ))
+            return
+        differences = verify_analytics(db, archive_db)
+        for difference in differences:
+            print(difference)
+        print("{} differences".format(len(differences)))
+        if differences:
+            raise SystemExit(1)
+    finally:
+        if archive_db is not None:
+            archive_db.close()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import os
+from datetime import datetime
+from datetime import timedelta
+
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.analytics import bump
+from app.config import ARCHIVE_AFTER_DAYS
+from app.config import ARCHIVE_DATABASE_URL
+from app.config import DATA_DIR
+from app.database import Base
+from app.database import SessionLocal
+from app.database import add_missing_columns
+from app.database import build_engine
+from app.database import engine
+from app.database import prepare_schema
+from app.database import reserve_ids
+from app.focus_calendar import backfill_local_dates
+from app.models import ArchivedFocusSummary
+from app.models import CollectionCycle
+from app.models import CycleRun
+from app.models import FocusCompletionRecord
+from app.models import FocusTaskRecord
+from app.models import PrunedRunTotal
+from app.models import RewardEntitlement
+from app.models import TaskVocabulary
+from app.task_vocabulary import ensure_task_ids
+from app.task_vocabulary import require_compacted_task_records
+
+
+ARCHIVE_TABLES = [
+    CycleRun.__table__,
+    FocusCompletionRecord.__table__,
+    FocusTaskRecord.__table__,
+    RewardEntitlement.__table__,
+    TaskVocabulary.__table__,
+]
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVED_ID_TABLES = [
+    CycleRun.__table__,
+    FocusCompletionRecord.__table__,
+    FocusTaskRecord.__table__,
+    RewardEntitlement.__table__,
+]
+
+
+class ArchiveConflictError(RuntimeError):
+    pass
+
+
+def create_archive_engine(url: str = ARCHIVE_DATABASE_URL):
+    archive_engine = build_engine(url)
+    Base.metadata.create_all(bind=archive_engine, tables=ARCHIVE_TABLES)
+    add_missing_columns(archive_engine)
+    require_compacted_task_records(archive_engine)
+    return archive_engine
+
+
+def find_archivable_run_ids(db: Session, cutoff: datetime, limit: int) -> list:
+    pending_run_ids = db.query(RewardEntitlement.run_id).filter(RewardEntitlement.status == "pending")
+    rows = db.query(CycleRun.id).filter(
+        CycleRun.status.in_(("completed", "stopped")),
+        CycleRun.updated_at < cutoff,
+        ~CycleRun.id.in_(pending_run_ids),
+    ).order_by(CycleRun.id).limit(limit).all()
+    return [row[0] for row in rows]
+
+
+def summarize_runs(db: Session, run_ids: list) -> dict:
+    focus_date = FocusCompletionRecord.local_date
+    totals = {}
+    focus_rows = db.query(CycleRun.user_id, focus_date, func.count(FocusCompletionRecord.id)).join(
+        CycleRun, FocusCompletionRecord.run_id == CycleRun.id
+    ).filter(FocusCompletionRecord.run_id.in_(run_ids)).group_by(CycleRun.user_id, focus_date).all()
+    for user_id, day, count in focus_rows:
+        totals.setdefault((user_id, day), {"focus": 0, "todo": 0, "nottodo": 0})["focus"] += count
+    task_rows = db.query(
+        CycleRun.user_id,
+        focus_date,
+        FocusTaskRecord.task_type,
+        func.count(FocusTaskRecord.id),
+    ).join(
+        FocusCompletionRecord,
+        FocusTaskRecord.focus_completion_record_id == FocusCompletionRecord.id,
+    ).join(CycleRun, FocusCompletionRecord.run_id == CycleRun.id).filter(
+        FocusCompletionRecord.run_id.in_(run_ids)
+    ).group_by(CycleRun.user_id, focus_date, FocusTaskRecord.task_type).all()
+    for user_id, day, task_type, count in task_rows:
+        bucket = totals.setdefault((user_id, day), {"focus": 0, "todo": 0, "nottodo": 0})
+        if task_type in bucket:
+            bucket[task_type] += count
+    return totals
+
+
+def merge_summaries(db: Session, totals: dict):
+    if not totals:
+        return
+    user_ids = set([user_id for user_id, _ in totals])
+    existing = db.query(ArchivedFocusSummary).filter(ArchivedFocusSummary.user_id.in_(user_ids)).all()
+    by_key = dict(((summary.user_id, summary.focus_date), summary) for summary in existing)
+    fresh = []
+    for (user_id, day), counts in totals.items():
+        summary = by_key.get((user_id, day))
+        if not summary:
+            fresh.append({
+                "user_id": user_id,
+                "focus_date": day,
+                "focus_count": counts["focus"],
+                "todo_count": counts["todo"],
+                "nottodo_count": counts["nottodo"],
+            })
+            continue
+        summary.focus_count += counts["focus"]
+        summary.todo_count += counts["todo"]
+        summary.nottodo_count += counts["nottodo"]
+    if fresh:
+        db.execute(ArchivedFocusSummary.__table__.insert(), fresh)
+
+
+def copy_rows(archive_connection, table, rows: list):
+    if not rows:
+        return
+    existing = dict(
+        (row["id"], dict(row))
+        for row in archive_connection.execute(
+            table.select().where(table.c.id.in_([row["id"] for row in rows]))
+        ).mappings()
+    )
+    for row in rows:
+        if row["id"] in existing and existing[row["id"]] != row:
+            raise ArchiveConflictError(
+                "{} id {} is already archived with different contents".format(table.name, row["id"])
+            )
+    fresh = [row for row in rows if row["id"] not in existing]
+    if fresh:
+        archive_connection.execute(table.insert(), fresh)
+
+
+def reserve_archived_ids(db: Session, archive_engine):
+    with archive_engine.connect() as archive_connection:
+        floors = dict(
+            (table.name, archive_connection.execute(select(func.max(table.c.id))).scalar())
+            for table in ARCHIVED_ID_TABLES
+        )
+    reserve_ids(db.get_bind(), floors)
+
+
+def archive_run_batch(db: Session, archive_engine, run_ids: list) -> dict:
+    runs = CycleRun.__table__
+    records = FocusCompletionRecord.__table__
+    tasks = FocusTaskRecord.__table__
+    entitlements = RewardEntitlement.__table__
+    record_ids = db.query(FocusCompletionRecord.id).filter(FocusCompletionRecord.run_id.in_(run_ids))
+    run_rows = [dict(row) for row in db.execute(runs.select().where(runs.c.id.in_(run_ids))).mappings()]
+    record_rows = [dict(row) for row in db.execute(records.select().where(records.c.run_id.in_(run_ids))).mappings()]
+    task_rows = [
+        dict(row)
+        for row in db.execute(tasks.select().where(tasks.c.focus_completion_record_id.in_(record_ids))).mappings()
+    ]
+    entitlement_rows = [
+        dict(row) for row in db.execute(entitlements.select().where(entitlements.c.run_id.in_(run_ids))).mappings()
+    ]
+    task_ids = set([row["task_id"] for row in task_rows if row["task_id"] is not None])
+    vocabulary = dict(
+        (task_id, (user_id, content))
+        for task_id, user_id, content in db.query(
+            TaskVocabulary.id, TaskVocabulary.user_id, TaskVocabulary.content
+        ).filter(TaskVocabulary.id.in_(task_ids))
+    ) if task_ids else {}
+    kept_run_ids = set([row["run_id"] for row in record_rows])
+    kept_run_ids.update(
+        run_id for (run_id,) in db.query(CollectionCycle.source_run_id).filter(CollectionCycle.source_run_id.in_(run_ids))
+    )
+    archived_runs = [row for row in run_rows if row["id"] in kept_run_ids or row["status"] != "stopped"]
+
+    with archive_engine.begin() as archive_connection:
+        archive_task_ids = ensure_task_ids(archive_connection, vocabulary.values())
+        for row in task_rows:
+            if row["task_id"] is not None:
+                row["task_id"] = archive_task_ids[vocabulary[row["task_id"]]]
+        copy_rows(archive_connection, runs, archived_runs)
+        copy_rows(archive_connection, records, record_rows)
+        copy_rows(archive_connection, tasks, task_rows)
+        copy_rows(archive_connection, entitlements, entitlement_rows)
+
+    merge_summaries(db, summarize_runs(db, run_ids))
+    pruned = {}
+    for row in run_rows:
+        if row["id"] not in kept_run_ids and row["status"] == "stopped":
+            key = (row["cycle_blueprint_id"], row["cycle_mode"], row["status"])
+            pruned[key] = pruned.get(key, 0) + 1
+    for (blueprint_id, mode, status), count in pruned.items():
+        bump(
+            db,
+            PrunedRunTotal,
+            {"cycle_blueprint_id": blueprint_id, "cycle_mode": mode, "status": status},
+            {"run_count": count},
+        )
+    db.query(FocusTaskRecord).filter(
+        FocusTaskRecord.focus_completion_record_id.in_(record_ids)
+    ).delete(synchronize_session=False)
+    db.query(FocusCompletionRecord).filter(
+        FocusCompletionRecord.run_id.in_(run_ids)
+    ).delete(synchronize_session=False)
+    db.query(RewardEntitlement).filter(RewardEntitlement.run_id.in_(run_ids)).delete(synchronize_session=False)
+    db.query(CycleRun).filter(CycleRun.id.in_(run_ids)).delete(synchronize_session=False)
+    db.commit()
+    return {
+        "runsArchived": len(archived_runs),
+        "runsPruned": len(run_rows) - len(archived_runs),
+        "recordsArchived": len(record_rows),
+        "tasksArchived": len(task_rows),
+    }
+
+
+def archive_old_runs(
+    db: Session,
+    archive_engine,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> dict:
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    totals = {"runsArchived": 0, "runsPruned": 0, "recordsArchived": 0, "tasksArchived": 0}
+    reserve_archived_ids(db, archive_engine)
+    while True:
+        run_ids = find_archivable_run_ids(db, cutoff, batch_size)
+        if not run_ids:
+            break
+        stats = archive_run_batch(db, archive_engine, run_ids)
+        for key, value in stats.items():
+            totals[key] += value
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old focus history into the archive database.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--archive-url", default=ARCHIVE_DATABASE_URL)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args()
+    os.makedirs(DATA_DIR, exist_ok=True)
+    prepare_schema(engine)
+    require_compacted_task_records(engine)
+    archive_engine = create_archive_engine(args.archive_url)
+    db = SessionLocal()
+    try:
+        backfill_local_dates(db)
+        stats = archive_old_runs(db, archive_engine, older_than_days=args.days, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(
+        "archived {runsArchived} runs, {recordsArchived} focus records, {tasksArchived} tasks; "
+        "pruned {runsPruned} stopped runs".format(**stats)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.config import CACHE_BACKEND
+from app.config import CACHE_MAX_ENTRIES
+from app.config import CACHE_PATH
+from app.config import CACHE_TTL_SECONDS
+
+
+MISSING = object()
+SQLITE_PRUNE_EVERY = 500
+
+
+class BaseCache:
+    def __init__(self, ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    def generation(self, namespace: str) -> int:
+        raise NotImplementedError
+
+    def get(self, namespace: str, key, default=None):
+        raise NotImplementedError
+
+    def set(self, namespace: str, key, value, ttl_seconds: int = None, generation: int = None):
+        raise NotImplementedError
+
+    def invalidate(self, namespace: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_or_set(self, namespace: str, key, factory, ttl_seconds: int = None, store: bool = True):
+        value = self.get(namespace, key, MISSING)
+        if value is not MISSING:
+            return value
+        if not store:
+            return factory()
+        generation = self.generation(namespace)
+        value = factory()
+        self.set(namespace, key, value, ttl_seconds=ttl_seconds, generation=generation)
+        return value
+
+
+class NullCache(BaseCache):
+    def generation(self, namespace: str) -> int:
+        return 0
+
+    def get(self, namespace: str, key, default=None):
+        return default
+
+    def set(self, namespace: str, key, value, ttl_seconds: int = None, generation: int = None):
+        return None
+
+    def invalidate(self, namespace: str):
+        return None
+
+    def clear(self):
+        return None
+
+
+class MemoryCache(BaseCache):
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_seconds: int = CACHE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace: str) -> int:
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, namespace: str, key, default=None):
+        with self._lock:
+            entry_key = (namespace, self._generations.get(namespace, 0), str(key))
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[entry_key]
+                return default
+            self._entries.move_to_end(entry_key)
+        return json.loads(value)
+
+    def set(self, namespace: str, key, value, ttl_seconds: int = None, generation: int = None):
+        encoded = json.dumps(value)
+        expires_at = time.monotonic() + (ttl_seconds or self.ttl_seconds)
+        with self._lock:
+            current = self._generations.get(namespace, 0)
+            if generation is not None and generation != current:
+                return
+            entry_key = (namespace, current, str(key))
+            self._entries[entry_key] = (encoded, expires_at)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, path: str = CACHE_PATH, ttl_seconds: int = CACHE_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.register_at_fork(after_in_child=self._forget_connections)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT NOT NULL, cache_key TEXT NOT NULL, generation INTEGER NOT NULL, "
+            "value TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (namespace, cache_key))"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_generations ("
+            "namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+        )
+
+    def _forget_connections(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def generation(self, namespace: str) -> int:
+        row = self._connection().execute(
+            "SELECT generation FROM cache_generations WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get(self, namespace: str, key, default=None):
+        row = self._connection().execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND cache_key = ? AND expires_at > ? "
+            "AND generation = (SELECT COALESCE(MAX(generation), 0) FROM cache_generations WHERE namespace = ?)",
+            (namespace, str(key), time.time(), namespace),
+        ).fetchone()
+        if not row:
+            return default
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key, value, ttl_seconds: int = None, generation: int = None):
+        connection = self._connection()
+        current = self.generation(namespace)
+        if generation is not None and generation != current:
+            return
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, cache_key, generation, value, expires_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (namespace, str(key), current, json.dumps(value), time.time() + (ttl_seconds or self.ttl_seconds)),
+        )
+        self._writes += 1
+        if self._writes % SQLITE_PRUNE_EVERY == 0:
+            self.prune()
+
+    def invalidate(self, namespace: str):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO cache_generations (namespace, generation) VALUES (?, 1) "
+                "ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1",
+                (namespace,),
+            )
+            connection.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+
+    def prune(self):
+        self._connection().execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        connection = self._connection()
+        connection.execute("DELETE FROM cache_entries")
+        connection.execute("DELETE FROM cache_generations")
+
+
+def build_cache(backend: str = CACHE_BACKEND) -> BaseCache:
+    if backend == "sqlite":
+        return SQLiteCache()
+    if backend == "none":
+        return NullCache()
+    return MemoryCache()
+
+
+cache = build_cache()
+
+
+def user_namespace(kind: str, user_id: int) -> str:
+    return "{}:{}".format(kind, user_id)
+
+
+def invalidate_user(user_id: int, *kinds):
+    for kind in kinds:
+        cache.invalidate(user_namespace(kind, user_id))
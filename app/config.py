@@ -3,11 +3,42 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 APP_DIR = os.path.join(BASE_DIR, "app")
-SAMPLE_DIR = os.path.join(BASE_DIR, "sample")
-UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+SAMPLE_DIR = os.getenv("SAMPLE_DIR", os.path.join(BASE_DIR, "sample"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(BASE_DIR, "uploads"))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///{}".format(os.path.join(DATA_DIR, "pure_focus.db")))
 SECRET_KEY = os.getenv("SECRET_KEY", "pure-focus-dev-secret")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
 DEMO_EMAIL = os.getenv("DEMO_EMAIL", "demo@purefocus.local")
 DEMO_NAME = os.getenv("DEMO_NAME", "Demo User")
+ARCHIVE_DATABASE_URL = os.getenv(
+    "ARCHIVE_DATABASE_URL", "sqlite:///{}".format(os.path.join(DATA_DIR, "pure_focus_archive.db"))
+)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(DATA_DIR, "pure_focus_cache.db"))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+PHOTO_SEARCH_PROVIDER = os.getenv("PHOTO_SEARCH_PROVIDER", "local")
+PHOTO_CATALOG_PATH = os.getenv("PHOTO_CATALOG_PATH", os.path.join(DATA_DIR, "unsplash_catalog.json"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_MODE = os.getenv("JOB_MODE", "threads")
+ADMIN_EMAILS = set(email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip())
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "20"))
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL", "")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_WRITE_BURST = int(os.getenv("RATE_LIMIT_WRITE_BURST", "60"))
+RATE_LIMIT_WRITE_PER_SECOND = float(os.getenv("RATE_LIMIT_WRITE_PER_SECOND", "2"))
+RATE_LIMIT_UPLOAD_BURST = int(os.getenv("RATE_LIMIT_UPLOAD_BURST", "10"))
+RATE_LIMIT_UPLOAD_PER_SECOND = float(os.getenv("RATE_LIMIT_UPLOAD_PER_SECOND", "0.1"))
+SHED_MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "64"))
+SHED_MAX_WRITES_IN_FLIGHT = int(os.getenv("SHED_MAX_WRITES_IN_FLIGHT", "16"))
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", "8000"))
+SERVE_BACKLOG = int(os.getenv("SERVE_BACKLOG", "2048"))
+SERVE_KEEP_ALIVE_SECONDS = int(os.getenv("SERVE_KEEP_ALIVE_SECONDS", "15"))
+SERVE_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("SERVE_GRACEFUL_TIMEOUT_SECONDS", "30"))
+SERVE_MAX_REQUESTS = int(os.getenv("SERVE_MAX_REQUESTS", "0"))
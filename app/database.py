@@ -1,17 +1,44 @@
+import os
+
 from sqlalchemy import create_engine
+from sqlalchemy import inspect
+from sqlalchemy import text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateTable
 
 from app.config import DATABASE_URL
+from app.config import REPLICA_DATABASE_URL
+
 
+def build_engine(url: str):
+    connect_args = {}
+    options = {}
+    if url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            options["poolclass"] = StaticPool
+    return create_engine(url, connect_args=connect_args, **options)
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = build_engine(DATABASE_URL)
+replica_engine = build_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReplicaSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=replica_engine or engine, info={"replica": True}
+)
 Base = declarative_base()
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def dispose_engines_after_fork():
+    engine.dispose(close=False)
+    if replica_engine is not None:
+        replica_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_engines_after_fork)
 
 
 def get_db():
@@ -20,3 +47,85 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def is_replica(db) -> bool:
+    return bool(db is not None and db.info.get("replica"))
+
+
+def add_missing_columns(bind):
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = set([column["name"] for column in inspector.get_columns(table.name)])
+            missing = [column for column in table.columns if column.name not in existing]
+            for column in missing:
+                ddl = "ALTER TABLE {} ADD COLUMN {} {}".format(
+                    table.name,
+                    column.name,
+                    column.type.compile(dialect=bind.dialect),
+                )
+                if column.server_default is not None:
+                    ddl += " DEFAULT '{}'".format(column.server_default.arg)
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                connection.execute(text(ddl))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
+def rebuild_autoincrement_tables(bind):
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not table.dialect_options["sqlite"]["autoincrement"]:
+                continue
+            ddl = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": table.name},
+            ).scalar()
+            if not ddl or "AUTOINCREMENT" in ddl.upper():
+                continue
+            existing = [row[1] for row in connection.execute(text("PRAGMA table_info({})".format(table.name)))]
+            if set(existing) - set(table.columns.keys()):
+                # Legacy columns still hold data (e.g. focus_task_records.content); rebuild after compaction.
+                continue
+            rebuilt_name = "{}__rebuild".format(table.name)
+            columns = ", ".join(existing)
+            create = str(CreateTable(table).compile(dialect=bind.dialect))
+            connection.execute(text(create.replace(
+                "CREATE TABLE {} ".format(table.name), "CREATE TABLE {} ".format(rebuilt_name), 1
+            )))
+            connection.execute(text("INSERT INTO {0} ({1}) SELECT {1} FROM {2}".format(rebuilt_name, columns, table.name)))
+            connection.execute(text("DROP TABLE {}".format(table.name)))
+            connection.execute(text("ALTER TABLE {} RENAME TO {}".format(rebuilt_name, table.name)))
+            for index in table.indexes:
+                index.create(connection)
+
+
+def reserve_ids(bind, floors: dict):
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as connection:
+        for name, floor in floors.items():
+            if not floor:
+                continue
+            updated = connection.execute(
+                text("UPDATE sqlite_sequence SET seq = :floor WHERE name = :name AND seq < :floor"),
+                {"name": name, "floor": floor},
+            ).rowcount
+            known = connection.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = :name"), {"name": name}).first()
+            if not updated and not known:
+                connection.execute(
+                    text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :floor)"),
+                    {"name": name, "floor": floor},
+                )
+
+
+def prepare_schema(bind):
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    rebuild_autoincrement_tables(bind)
@@ -0,0 +1,144 @@
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from typing import List
+from typing import Optional
+from zoneinfo import ZoneInfo
+from zoneinfo import ZoneInfoNotFoundError
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import ArchivedFocusSummary
+from app.models import CycleRun
+from app.models import FocusCompletionRecord
+from app.models import FocusDailyCount
+
+
+DEFAULT_CALENDAR_DAYS = 365
+MAX_CALENDAR_DAYS = 366
+
+
+def load_timezone(name: str) -> Optional[ZoneInfo]:
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def local_date_for(moment: datetime, timezone_name: str) -> str:
+    zone = load_timezone(timezone_name) or dt_timezone.utc
+    return moment.replace(tzinfo=dt_timezone.utc).astimezone(zone).date().isoformat()
+
+
+def backfill_local_dates(db: Session):
+    db.query(FocusCompletionRecord).filter(FocusCompletionRecord.local_date.is_(None)).update(
+        {FocusCompletionRecord.local_date: func.date(FocusCompletionRecord.recorded_at)},
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def refresh_daily_count(db: Session, user_id: int, focus_date: str):
+    live_count = db.query(func.count(FocusCompletionRecord.id)).filter(
+        FocusCompletionRecord.run_id.in_(db.query(CycleRun.id).filter(CycleRun.user_id == user_id)),
+        FocusCompletionRecord.local_date == focus_date,
+    ).scalar() or 0
+    archived_count = db.query(ArchivedFocusSummary.focus_count).filter(
+        ArchivedFocusSummary.user_id == user_id,
+        ArchivedFocusSummary.focus_date == focus_date,
+    ).scalar() or 0
+    updated = db.query(FocusDailyCount).filter(
+        FocusDailyCount.user_id == user_id,
+        FocusDailyCount.focus_date == focus_date,
+    ).update({FocusDailyCount.focus_count: live_count + archived_count}, synchronize_session=False)
+    if not updated:
+        db.add(FocusDailyCount(user_id=user_id, focus_date=focus_date, focus_count=live_count + archived_count))
+
+
+def rebuild_daily_counts(db: Session):
+    totals = {}
+    live_rows = db.query(
+        CycleRun.user_id,
+        FocusCompletionRecord.local_date,
+        func.count(FocusCompletionRecord.id),
+    ).join(CycleRun, FocusCompletionRecord.run_id == CycleRun.id).group_by(
+        CycleRun.user_id, FocusCompletionRecord.local_date
+    ).all()
+    archived_rows = db.query(
+        ArchivedFocusSummary.user_id,
+        ArchivedFocusSummary.focus_date,
+        ArchivedFocusSummary.focus_count,
+    ).all()
+    for user_id, day, count in list(live_rows) + list(archived_rows):
+        totals[(user_id, day)] = totals.get((user_id, day), 0) + count
+    db.query(FocusDailyCount).delete(synchronize_session=False)
+    db.bulk_insert_mappings(
+        FocusDailyCount,
+        [
+            {"user_id": user_id, "focus_date": day, "focus_count": count}
+            for (user_id, day), count in totals.items()
+        ],
+    )
+    db.commit()
+
+
+def ensure_daily_counts(db: Session):
+    if db.query(FocusDailyCount.id).first():
+        return
+    has_history = db.query(FocusCompletionRecord.id).first() or db.query(ArchivedFocusSummary.id).first()
+    if has_history:
+        rebuild_daily_counts(db)
+
+
+def resolve_calendar_range(start: Optional[date], end: Optional[date], timezone: ZoneInfo):
+    span = timedelta(days=DEFAULT_CALENDAR_DAYS - 1)
+    if not end:
+        end = start + min(span, date.max - start) if start else datetime.now(timezone).date()
+    if not start:
+        start = end - min(span, end - date.min)
+    return start, end
+
+
+def intensity_quartiles(counts: List[int]) -> List[int]:
+    active = sorted([count for count in counts if count > 0])
+    if not active:
+        return [0, 0, 0]
+    return [active[(len(active) - 1) * step // 4] for step in (1, 2, 3)]
+
+
+def intensity_level(count: int, quartiles: List[int]) -> int:
+    if count <= 0:
+        return 0
+    level = 1
+    for threshold in quartiles:
+        if count > threshold:
+            level += 1
+    return level
+
+
+def calendar_buckets(db: Session, user_id: int, start: date, end: date) -> dict:
+    rows = db.query(FocusDailyCount.focus_date, FocusDailyCount.focus_count).filter(
+        FocusDailyCount.user_id == user_id,
+        FocusDailyCount.focus_date >= start.isoformat(),
+        FocusDailyCount.focus_date <= end.isoformat(),
+    ).all()
+    counts = dict(rows)
+    days = [
+        counts.get((start + timedelta(days=index)).isoformat(), 0)
+        for index in range((end - start).days + 1)
+    ]
+    quartiles = intensity_quartiles(days)
+    return {
+        "quartiles": quartiles,
+        "total": sum(days),
+        "days": [
+            {
+                "date": (start + timedelta(days=index)).isoformat(),
+                "count": count,
+                "level": intensity_level(count, quartiles),
+            }
+            for index, count in enumerate(days)
+        ],
+    }
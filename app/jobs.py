@@ -0,0 +1,377 @@
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.cache import cache
+from app.cache import invalidate_user
+from app.config import JOB_MAX_ATTEMPTS
+from app.config import JOB_MODE
+from app.config import JOB_POLL_SECONDS
+from app.config import JOB_WORKERS
+from app.config import UPLOAD_DIR
+from app.database import SessionLocal
+from app.database import engine
+from app.database import prepare_schema
+from app.focus_calendar import refresh_daily_count
+from app.models import BackgroundJob
+from app.models import CollectionCycle
+from app.models import CycleBlueprint
+from app.models import Photo
+from app.photos import apply_photo_metadata
+from app.photos import build_mosaic
+from app.photos import ensure_photo_thumbnail
+from app.photos import mosaic_key
+from app.replica import record_job_write
+from app.seed import grant_asset_if_missing
+
+
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+LOCK_TIMEOUT_SECONDS = 300
+LOCK_HEARTBEAT_SECONDS = 60
+REQUEUE_INTERVAL_SECONDS = 60
+FINISHED_RETENTION_DAYS = 7
+CLAIM_CANDIDATES = 5
+GLOBAL_CACHE_NAMESPACES = ("blueprint",)
+JOB_HANDLERS = {}
+
+
+def job_handler(kind: str, invalidates: tuple = ()):
+    def register(function):
+        JOB_HANDLERS[kind] = (function, tuple(invalidates))
+        return function
+    return register
+
+
+def enqueue_job(
+    db: Session,
+    kind: str,
+    payload: dict,
+    user_id: int = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> BackgroundJob:
+    if kind not in JOB_HANDLERS:
+        raise ValueError("Unknown job kind: {}".format(kind))
+    job = BackgroundJob(
+        kind=kind,
+        payload_json=json.dumps(payload),
+        user_id=user_id,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    return job
+
+
+def serialize_job(job: BackgroundJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.last_error.strip().splitlines()[-1] if job.status == "failed" and job.last_error else None,
+    }
+
+
+def retry_delay(attempts: int) -> int:
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+def claim_next_job(db: Session) -> Optional[int]:
+    now = datetime.utcnow()
+    candidates = db.query(BackgroundJob.id).filter(
+        BackgroundJob.status == "queued",
+        BackgroundJob.run_after <= now,
+    ).order_by(BackgroundJob.run_after, BackgroundJob.id).limit(CLAIM_CANDIDATES).all()
+    for (job_id,) in candidates:
+        claimed = db.query(BackgroundJob).filter(
+            BackgroundJob.id == job_id,
+            BackgroundJob.status == "queued",
+        ).update(
+            {
+                BackgroundJob.status: "running",
+                BackgroundJob.attempts: BackgroundJob.attempts + 1,
+                BackgroundJob.locked_at: now,
+            },
+            synchronize_session=False,
+        )
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+class JobHeartbeat:
+    # Keeps locked_at fresh for running jobs so requeue_stale_jobs only reclaims jobs whose worker died.
+    def __init__(self, interval: float = LOCK_HEARTBEAT_SECONDS):
+        self.interval = interval
+        self.reset()
+
+    def reset(self):
+        self._job_ids = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self, job_id: int):
+        with self._lock:
+            self._job_ids.add(job_id)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-heartbeat", daemon=True)
+                self._thread.start()
+
+    def untrack(self, job_id: int):
+        with self._lock:
+            self._job_ids.discard(job_id)
+
+    def beat(self) -> int:
+        with self._lock:
+            job_ids = list(self._job_ids)
+        if not job_ids:
+            return 0
+        db = SessionLocal()
+        try:
+            touched = db.query(BackgroundJob).filter(
+                BackgroundJob.id.in_(job_ids),
+                BackgroundJob.status == "running",
+            ).update({BackgroundJob.locked_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+            return touched
+        except Exception:
+            db.rollback()
+            traceback.print_exc()
+            return 0
+        finally:
+            db.close()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.beat()
+
+
+job_heartbeat = JobHeartbeat()
+os.register_at_fork(after_in_child=job_heartbeat.reset)
+
+
+def run_job(db: Session, job_id: int) -> str:
+    job = db.query(BackgroundJob).get(job_id)
+    handler, invalidates = JOB_HANDLERS.get(job.kind, (None, ()))
+    job_heartbeat.track(job_id)
+    try:
+        if handler is None:
+            raise LookupError("No handler registered for job kind {}".format(job.kind))
+        handler(db, json.loads(job.payload_json))
+        job.status = "succeeded"
+        job.last_error = None
+        job.locked_at = None
+        job.finished_at = datetime.utcnow()
+        db.commit()
+    except Exception:
+        db.rollback()
+        job = db.query(BackgroundJob).get(job_id)
+        job.last_error = traceback.format_exc(limit=5)
+        job.locked_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = "queued"
+            job.run_after = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+        db.commit()
+        return job.status
+    finally:
+        job_heartbeat.untrack(job_id)
+    if job.user_id:
+        record_job_write(job.user_id, time.time())
+    for kind in invalidates:
+        if kind in GLOBAL_CACHE_NAMESPACES:
+            cache.invalidate(kind)
+        elif job.user_id:
+            invalidate_user(job.user_id, kind)
+    return job.status
+
+
+def run_pending(limit: int = None) -> int:
+    processed = 0
+    db = SessionLocal()
+    try:
+        while limit is None or processed < limit:
+            job_id = claim_next_job(db)
+            if job_id is None:
+                break
+            run_job(db, job_id)
+            processed += 1
+    finally:
+        db.close()
+    return processed
+
+
+def requeue_stale_jobs(db: Session, timeout_seconds: int = LOCK_TIMEOUT_SECONDS) -> int:
+    requeued = db.query(BackgroundJob).filter(
+        BackgroundJob.status == "running",
+        BackgroundJob.locked_at < datetime.utcnow() - timedelta(seconds=timeout_seconds),
+    ).update({BackgroundJob.status: "queued", BackgroundJob.locked_at: None}, synchronize_session=False)
+    db.commit()
+    return requeued
+
+
+def prune_finished_jobs(db: Session, older_than_days: int = FINISHED_RETENTION_DAYS) -> int:
+    pruned = db.query(BackgroundJob).filter(
+        BackgroundJob.status == "succeeded",
+        BackgroundJob.finished_at < datetime.utcnow() - timedelta(days=older_than_days),
+    ).delete(synchronize_session=False)
+    db.commit()
+    return pruned
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, mode: str = JOB_MODE, poll_seconds: float = JOB_POLL_SECONDS):
+        self.workers = workers
+        self.mode = mode
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._requeued_at = time.monotonic()
+
+    def start(self):
+        if self.mode != "threads" or self._threads:
+            return
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+            prune_finished_jobs(db)
+        finally:
+            db.close()
+        self._stopping.clear()
+        for index in range(max(self.workers, 1)):
+            thread = threading.Thread(target=self._work, name="job-worker-{}".format(index), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        if self.mode == "inline":
+            run_pending()
+        else:
+            self._wake.set()
+
+    def requeue_if_due(self):
+        now = time.monotonic()
+        if now - self._requeued_at < REQUEUE_INTERVAL_SECONDS:
+            return
+        self._requeued_at = now
+        db = SessionLocal()
+        try:
+            requeue_stale_jobs(db)
+        finally:
+            db.close()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                self.requeue_if_due()
+                if run_pending():
+                    continue
+            except Exception:
+                traceback.print_exc()
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+job_queue = JobQueue()
+
+
+@job_handler("grant_cycle_assets", invalidates=("ownership",))
+def grant_cycle_assets(db: Session, payload: dict):
+    blueprint = db.query(CycleBlueprint).get(payload["cycle_blueprint_id"])
+    for node in blueprint.focus_nodes:
+        grant_asset_if_missing(db, payload["user_id"], "photo", node.photo_id, "cycle_claim")
+        grant_asset_if_missing(db, payload["user_id"], "quote", node.quote_id, "cycle_claim")
+
+
+@job_handler("process_photo", invalidates=("collection", "blueprint"))
+def process_photo(db: Session, payload: dict):
+    photo = db.query(Photo).get(payload["photo_id"])
+    if photo:
+        apply_photo_metadata(photo)
+
+
+@job_handler("collection_thumbnails", invalidates=("collection", "blueprint"))
+def collection_thumbnails(db: Session, payload: dict):
+    item = db.query(CollectionCycle).get(payload["collection_cycle_id"])
+    if not item:
+        return
+    blueprint = db.query(CycleBlueprint).get(item.cycle_blueprint_id)
+    photos = [node.photo for node in blueprint.focus_nodes]
+    for photo in photos:
+        ensure_photo_thumbnail(photo)
+    key = mosaic_key(blueprint.id, photos)
+    if not os.path.exists(os.path.join(UPLOAD_DIR, key)):
+        build_mosaic(photos, key)
+    item.mosaic_key = key
+
+
+def enqueue_missing_thumbnails(db: Session) -> int:
+    pending = set()
+    for (payload_json,) in db.query(BackgroundJob.payload_json).filter(
+        BackgroundJob.kind == "collection_thumbnails",
+        BackgroundJob.status.in_(["queued", "running"]),
+    ):
+        pending.add(json.loads(payload_json)["collection_cycle_id"])
+    missing = db.query(CollectionCycle.id, CollectionCycle.user_id).filter(CollectionCycle.mosaic_key.is_(None)).all()
+    enqueued = 0
+    for collection_cycle_id, user_id in missing:
+        if collection_cycle_id not in pending:
+            enqueue_job(db, "collection_thumbnails", {"collection_cycle_id": collection_cycle_id}, user_id=user_id)
+            enqueued += 1
+    db.commit()
+    return enqueued
+
+
+@job_handler("refresh_focus_rollup", invalidates=("dashboard",))
+def refresh_focus_rollup(db: Session, payload: dict):
+    refresh_daily_count(db, payload["user_id"], payload["focus_date"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued background jobs outside the web process.")
+    parser.add_argument("--workers", type=int, default=JOB_WORKERS)
+    parser.add_argument("--once", action="store_true", help="drain the queue once and exit")
+    args = parser.parse_args()
+    prepare_schema(engine)
+    db = SessionLocal()
+    try:
+        requeue_stale_jobs(db)
+    finally:
+        db.close()
+    if args.once:
+        print("processed {} jobs".format(run_pending()))
+        return
+    queue = JobQueue(workers=args.workers, mode="threads")
+    queue.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        queue.stop()
+
+
+if __name__ == "__main__":
+    main()
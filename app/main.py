@@ -2,6 +2,7 @@ import json
 import os
 import shutil
 import uuid
+from datetime import date
 from datetime import datetime
 from typing import List
 from typing import Optional
@@ -15,28 +16,62 @@ from fastapi import Request
 from fastapi import UploadFile
 from fastapi.responses import HTMLResponse
 from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
+from fastapi.responses import Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from sqlalchemy import func
 from sqlalchemy.orm import Session
+from sqlalchemy.orm import object_session
 from starlette.middleware.sessions import SessionMiddleware
 
+from app.analytics import DEFAULT_ANALYTICS_DAYS
+from app.analytics import MAX_ANALYTICS_DAYS
+from app.analytics import analytics_overview
+from app.analytics import ensure_analytics
+from app.analytics import record_focus
+from app.analytics import record_run_started
+from app.analytics import record_run_status
+from app.analytics import record_trial_claim
+from app.analytics import record_trial_reward
+from app.cache import cache
+from app.cache import invalidate_user
+from app.cache import user_namespace
+from app.config import ADMIN_EMAILS
 from app.config import APP_DIR
 from app.config import GOOGLE_CLIENT_ID
+from app.config import PROFILING_ENABLED
+from app.config import RATE_LIMIT_ENABLED
 from app.config import SAMPLE_DIR
 from app.config import SECRET_KEY
 from app.config import UPLOAD_DIR
-from app.database import Base
 from app.database import engine
 from app.database import get_db
+from app.database import is_replica
+from app.database import prepare_schema
+from app.database import replica_engine
+from app.focus_calendar import MAX_CALENDAR_DAYS
+from app.focus_calendar import backfill_local_dates
+from app.focus_calendar import calendar_buckets
+from app.focus_calendar import ensure_daily_counts
+from app.focus_calendar import load_timezone
+from app.focus_calendar import local_date_for
+from app.focus_calendar import resolve_calendar_range
+from app.jobs import enqueue_job
+from app.jobs import enqueue_missing_thumbnails
+from app.jobs import job_queue
+from app.jobs import serialize_job
+from app.models import ArchivedFocusSummary
 from app.models import AuthAccount
+from app.models import BackgroundJob
 from app.models import CollectionCycle
 from app.models import CycleBlueprint
 from app.models import CycleBreakEdge
 from app.models import CycleFocusNode
 from app.models import CycleRun
 from app.models import FocusCompletionRecord
+from app.models import FocusDailyCount
 from app.models import FocusTaskRecord
 from app.models import Photo
 from app.models import Quote
@@ -44,18 +79,50 @@ from app.models import RewardEntitlement
 from app.models import User
 from app.models import UserAssetOwnership
 from app.models import UserCycleOwnership
+from app.photo_search import photo_provider
+from app.photo_search import search_photos
+from app.photos import PhotoFiles
+from app.profiling import DEFAULT_SAMPLE_INTERVAL_MS
+from app.profiling import ProfiledRoute
+from app.profiling import ProfilingMiddleware
+from app.profiling import format_collapsed
+from app.profiling import install_sql_timing
+from app.profiling import profile_dump
+from app.profiling import profile_report
+from app.profiling import profile_store
+from app.profiling import sample_stacks
+from app.quotes import backfill_quote_hashes
+from app.ratelimit import RateLimitMiddleware
+from app.ratelimit import rate_limiter
+from app.recommend import quote_index
+from app.recommend import recent_task_text
+from app.recommend import recommend_quotes
+from app.replica import WriteTrackingMiddleware
+from app.replica import get_read_db
 from app.seed import ensure_user_defaults
 from app.seed import get_or_create_demo_user
 from app.seed import grant_asset_if_missing
 from app.seed import seed_reference_data
+from app.task_vocabulary import add_task_records
+from app.task_vocabulary import require_compacted_task_records
 
 
 templates = Jinja2Templates(directory=os.path.join(APP_DIR, "templates"))
 app = FastAPI(title="Pure Focus")
+if PROFILING_ENABLED:
+    app.router.route_class = ProfiledRoute
+    app.add_middleware(ProfilingMiddleware, is_allowed=lambda request: request_is_admin(request))
+    install_sql_timing(engine)
+    if replica_engine is not None:
+        install_sql_timing(replica_engine)
+app.add_middleware(WriteTrackingMiddleware)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 app.mount("/static", StaticFiles(directory=os.path.join(APP_DIR, "static")), name="static")
-app.mount("/sample", StaticFiles(directory=SAMPLE_DIR), name="sample")
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/sample", PhotoFiles(directory=SAMPLE_DIR), name="sample")
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+app.mount("/uploads", PhotoFiles(directory=UPLOAD_DIR, max_age=31536000), name="uploads")
 
 
 class GoogleLoginPayload(BaseModel):
@@ -82,6 +149,19 @@ class CreateRunPayload(BaseModel):
     cycle_mode: str
 
 
+class TimezonePayload(BaseModel):
+    timezone: str
+
+
+class SelectPhotoPayload(BaseModel):
+    photo_id: str
+
+
+class RecommendQuotesPayload(BaseModel):
+    texts: List[str] = []
+    limit: int = 5
+
+
 class FocusCompletePayload(BaseModel):
     focus_order: int
     checked_todos: List[str]
@@ -90,20 +170,33 @@ class FocusCompletePayload(BaseModel):
 
 def initialize_app_state():
     os.makedirs(UPLOAD_DIR, exist_ok=True)
-    Base.metadata.create_all(bind=engine)
+    prepare_schema(engine)
+    require_compacted_task_records(engine)
     db = next(get_db())
     try:
+        backfill_quote_hashes(db)
         seed_reference_data(db)
+        backfill_local_dates(db)
+        ensure_daily_counts(db)
+        ensure_analytics(db)
+        queued_thumbnails = enqueue_missing_thumbnails(db)
     finally:
         db.close()
+    cache.invalidate("blueprint")
+    if queued_thumbnails:
+        job_queue.notify()
 
 
 @app.on_event("startup")
 def startup():
-    initialize_app_state()
+    if not getattr(app.state, "preloaded", False):
+        initialize_app_state()
+    job_queue.start()
 
 
-initialize_app_state()
+@app.on_event("shutdown")
+def shutdown():
+    job_queue.stop()
 
 
 def get_user_from_session(request: Request, db: Session) -> Optional[User]:
@@ -120,7 +213,34 @@ def require_user(request: Request, db: Session = Depends(get_db)) -> User:
     return user
 
 
+def is_admin(user: Optional[User]) -> bool:
+    return bool(user) and user.email.lower() in ADMIN_EMAILS
+
+
+def require_admin(user: User = Depends(require_user)) -> User:
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+def request_is_admin(request: Request) -> bool:
+    if not request.session.get("user_id"):
+        return False
+    db = next(get_db())
+    try:
+        return is_admin(get_user_from_session(request, db))
+    finally:
+        db.close()
+
+
+def require_profiling():
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+
 def photo_url(photo: Photo) -> str:
+    if photo.origin == "unsplash":
+        return photo.storage_key
     if photo.origin == "sample":
         return "/sample/{}".format(photo.storage_key)
     return "/uploads/{}".format(photo.storage_key)
@@ -133,6 +253,9 @@ def serialize_photo(photo: Photo) -> dict:
         "url": photo_url(photo),
         "sourceLabel": photo.source_label,
         "sourceUrl": photo.source_url,
+        "placeholder": photo.placeholder,
+        "dominantColor": photo.dominant_color,
+        "thumbnailUrl": "/uploads/{}".format(photo.thumbnail_key) if photo.thumbnail_key else None,
     }
 
 
@@ -147,13 +270,25 @@ def serialize_quote(quote: Quote) -> dict:
 
 
 def serialize_blueprint(blueprint: CycleBlueprint, owned: bool, trial_available: bool) -> dict:
-    return {
+    payload = {
         "id": blueprint.id,
         "name": blueprint.name,
         "mode": "owned" if owned else "trial",
         "owned": owned,
         "trialAvailable": trial_available,
         "editable": owned or blueprint.mode == "custom",
+    }
+    payload.update(cache.get_or_set(
+        "blueprint",
+        blueprint.id,
+        lambda: serialize_blueprint_layout(blueprint),
+        store=not is_replica(object_session(blueprint)),
+    ))
+    return payload
+
+
+def serialize_blueprint_layout(blueprint: CycleBlueprint) -> dict:
+    return {
         "focusNodes": [
             {
                 "nodeOrder": node.node_order,
@@ -175,27 +310,28 @@ def serialize_blueprint(blueprint: CycleBlueprint, owned: bool, trial_available:
 
 
 def parse_task_items(items: List[str]) -> List[str]:
-    results = []
-    for item in items:
-        text = item.strip()
-        if text and text not in results:
-            results.append(text)
-    return results
+    return list(dict.fromkeys(text for text in (item.strip() for item in items) if text))
 
 
 def get_owned_asset_ids(db: Session, user_id: int, asset_type: str) -> set:
-    rows = db.query(UserAssetOwnership.asset_id).filter(
-        UserAssetOwnership.user_id == user_id,
-        UserAssetOwnership.asset_type == asset_type,
-    ).all()
-    return set([row[0] for row in rows])
+    def load():
+        rows = db.query(UserAssetOwnership.asset_id).filter(
+            UserAssetOwnership.user_id == user_id,
+            UserAssetOwnership.asset_type == asset_type,
+        ).all()
+        return [row[0] for row in rows]
+
+    return set(cache.get_or_set(user_namespace("ownership", user_id), asset_type, load, store=not is_replica(db)))
 
 
 def get_owned_cycle_ids(db: Session, user_id: int) -> set:
-    rows = db.query(UserCycleOwnership.cycle_blueprint_id).filter(
-        UserCycleOwnership.user_id == user_id
-    ).all()
-    return set([row[0] for row in rows])
+    def load():
+        rows = db.query(UserCycleOwnership.cycle_blueprint_id).filter(
+            UserCycleOwnership.user_id == user_id
+        ).all()
+        return [row[0] for row in rows]
+
+    return set(cache.get_or_set(user_namespace("ownership", user_id), "cycle", load, store=not is_replica(db)))
 
 
 def ensure_reward_entitlement(db: Session, run: CycleRun) -> RewardEntitlement:
@@ -226,6 +362,11 @@ def use_reward_entitlement(db: Session, run_id: int, user_id: int) -> RewardEnti
     return entitlement
 
 
+def dispatch_jobs(jobs: list) -> list:
+    job_queue.notify()
+    return [serialize_job(job) for job in jobs]
+
+
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
     return templates.TemplateResponse(
@@ -290,9 +431,19 @@ def me(request: Request, db: Session = Depends(get_db)):
         "email": user.email,
         "nickname": user.nickname,
         "profileImageUrl": user.profile_image_url,
+        "timezone": user.timezone,
     }
 
 
+@app.post("/me/timezone")
+def update_timezone(payload: TimezonePayload, user: User = Depends(require_user), db: Session = Depends(get_db)):
+    if not load_timezone(payload.timezone):
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+    user.timezone = payload.timezone
+    db.commit()
+    return {"ok": True, "timezone": user.timezone}
+
+
 @app.get("/assets/photos")
 def get_photos(user: User = Depends(require_user), db: Session = Depends(get_db)):
     owned_ids = get_owned_asset_ids(db, user.id, "photo")
@@ -307,11 +458,34 @@ def get_quotes(user: User = Depends(require_user), db: Session = Depends(get_db)
     return {"items": [serialize_quote(quote) for quote in quotes]}
 
 
+@app.post("/quotes/recommend")
+def recommend(
+    payload: RecommendQuotesPayload,
+    user: User = Depends(require_user),
+    db: Session = Depends(get_db),
+):
+    limit = min(max(payload.limit, 1), 20)
+    text = " ".join(parse_task_items(payload.texts)) or recent_task_text(db, user.id)
+    if not text:
+        return {"items": []}
+    results = recommend_quotes(db, text, limit=limit, allowed_private_ids=get_owned_asset_ids(db, user.id, "quote"))
+    return {
+        "items": [
+            dict(serialize_quote(quote), score=round(score, 4))
+            for quote, score in results
+        ]
+    }
+
+
 @app.get("/cycles")
-def get_cycles(user: User = Depends(require_user), db: Session = Depends(get_db)):
+def get_cycles(
+    user: User = Depends(require_user),
+    db: Session = Depends(get_db),
+    read_db: Session = Depends(get_read_db),
+):
     ensure_user_defaults(db, user)
     owned_cycle_ids = get_owned_cycle_ids(db, user.id)
-    blueprints = db.query(CycleBlueprint).order_by(CycleBlueprint.id).all()
+    blueprints = read_db.query(CycleBlueprint).order_by(CycleBlueprint.id).all()
     items = []
     for blueprint in blueprints:
         owned = blueprint.id in owned_cycle_ids or blueprint.owner_user_id == user.id
@@ -376,6 +550,7 @@ def create_custom_cycle(
         )
     )
     db.commit()
+    invalidate_user(user.id, "ownership")
     db.refresh(blueprint)
     return {"item": serialize_blueprint(blueprint, owned=True, trial_available=False)}
 
@@ -401,8 +576,9 @@ def create_run(
         CycleRun.user_id == user.id,
         CycleRun.status == "active",
     ).all()
-    for run in active_runs:
-        run.status = "stopped"
+    for active_run in active_runs:
+        active_run.status = "stopped"
+        record_run_status(db, active_run, "active")
     run = CycleRun(
         user_id=user.id,
         cycle_blueprint_id=blueprint.id,
@@ -411,6 +587,8 @@ def create_run(
         completed_focus_count=0,
     )
     db.add(run)
+    db.flush()
+    record_run_started(db, run)
     db.commit()
     db.refresh(run)
     return {"runId": run.id}
@@ -434,22 +612,28 @@ def complete_focus(
     if not node:
         raise HTTPException(status_code=400, detail="Focus node not found")
     node = node[0]
+    recorded_at = datetime.utcnow()
     record = FocusCompletionRecord(
         run_id=run.id,
         focus_order=payload.focus_order,
         photo_id=node.photo_id,
         quote_id=node.quote_id,
         focus_duration_seconds=node.focus_duration_seconds,
+        recorded_at=recorded_at,
+        local_date=local_date_for(recorded_at, user.timezone),
     )
     db.add(record)
     db.flush()
-    for item in parse_task_items(payload.checked_todos):
-        db.add(FocusTaskRecord(focus_completion_record_id=record.id, task_type="todo", content=item))
-    for item in parse_task_items(payload.remaining_nottodos):
-        db.add(FocusTaskRecord(focus_completion_record_id=record.id, task_type="nottodo", content=item))
+    enqueue_job(db, "refresh_focus_rollup", {"user_id": user.id, "focus_date": record.local_date}, user_id=user.id)
+    checked_todos = parse_task_items(payload.checked_todos)
+    remaining_nottodos = parse_task_items(payload.remaining_nottodos)
+    add_task_records(db, record.id, user.id, {"todo": checked_todos, "nottodo": remaining_nottodos})
+    record_focus(db, user.id, record.local_date, len(checked_todos) + len(remaining_nottodos))
     run.completed_focus_count = payload.focus_order
     run.updated_at = datetime.utcnow()
     db.commit()
+    invalidate_user(user.id, "dashboard")
+    job_queue.notify()
     return {"completedFocusCount": run.completed_focus_count}
 
 
@@ -458,7 +642,9 @@ def stop_run(run_id: int, user: User = Depends(require_user), db: Session = Depe
     run = db.query(CycleRun).filter(CycleRun.id == run_id, CycleRun.user_id == user.id).first()
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
+    previous_status = run.status
     run.status = "stopped"
+    record_run_status(db, run, previous_status)
     run.updated_at = datetime.utcnow()
     db.commit()
     return {"ok": True}
@@ -472,9 +658,14 @@ def complete_run(run_id: int, user: User = Depends(require_user), db: Session =
     total_focus = len(run.cycle_blueprint.focus_nodes)
     if run.completed_focus_count != total_focus:
         raise HTTPException(status_code=400, detail="Run is not ready to complete")
+    previous_status = run.status
     run.status = "completed"
+    if previous_status != "completed":
+        record_run_status(db, run, previous_status)
+        record_trial_reward(db, run)
     entitlement = ensure_reward_entitlement(db, run)
     db.commit()
+    invalidate_user(user.id, "dashboard")
     return {
         "ok": True,
         "reward": {
@@ -503,18 +694,26 @@ def claim_cycle(run_id: int, user: User = Depends(require_user), db: Session = D
                 ownership_source="cycle_claim",
             )
         )
-    for node in blueprint.focus_nodes:
-        grant_asset_if_missing(db, user.id, "photo", node.photo_id, "cycle_claim")
-        grant_asset_if_missing(db, user.id, "quote", node.quote_id, "cycle_claim")
-    db.add(
-        CollectionCycle(
-            user_id=user.id,
-            cycle_blueprint_id=blueprint.id,
-            source_run_id=run.id,
-        )
+    collection_cycle = CollectionCycle(
+        user_id=user.id,
+        cycle_blueprint_id=blueprint.id,
+        source_run_id=run.id,
     )
+    db.add(collection_cycle)
+    db.flush()
+    record_trial_claim(db, run)
+    jobs = [
+        enqueue_job(
+            db,
+            "grant_cycle_assets",
+            {"user_id": user.id, "cycle_blueprint_id": blueprint.id},
+            user_id=user.id,
+        ),
+        enqueue_job(db, "collection_thumbnails", {"collection_cycle_id": collection_cycle.id}, user_id=user.id),
+    ]
     db.commit()
-    return {"ok": True}
+    invalidate_user(user.id, "ownership", "collection")
+    return {"ok": True, "jobs": dispatch_jobs(jobs)}
 
 
 @app.post("/rewards/{run_id}/upload-photo")
@@ -539,7 +738,61 @@ def reward_upload_photo(
     db.add(photo)
     db.flush()
     grant_asset_if_missing(db, user.id, "photo", photo.id, "reward_upload")
+    job = enqueue_job(db, "process_photo", {"photo_id": photo.id}, user_id=user.id)
     db.commit()
+    invalidate_user(user.id, "ownership")
+    jobs = dispatch_jobs([job])
+    return {"ok": True, "photo": serialize_photo(photo), "jobs": jobs}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: int, user: User = Depends(require_user), db: Session = Depends(get_db)):
+    job = db.query(BackgroundJob).filter(BackgroundJob.id == job_id, BackgroundJob.user_id == user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialize_job(job)
+
+
+@app.get("/photos/search")
+def photo_search(
+    query: str,
+    page: int = 1,
+    per_page: int = 10,
+    user: User = Depends(require_user),
+):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Search query is required")
+    return search_photos(query, page=page, per_page=per_page)
+
+
+@app.post("/rewards/{run_id}/select-photo")
+def reward_select_photo(
+    run_id: int,
+    payload: SelectPhotoPayload,
+    user: User = Depends(require_user),
+    db: Session = Depends(get_db),
+):
+    result = photo_provider.get(payload.photo_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    use_reward_entitlement(db, run_id, user.id)
+    image_url = result["urls"]["regular"]
+    photo = db.query(Photo).filter(Photo.origin == "unsplash", Photo.storage_key == image_url).first()
+    if not photo:
+        photo = Photo(
+            origin="unsplash",
+            storage_key=image_url,
+            source_label="Photo by {} on Unsplash".format(result["user"]["name"] or "Unknown"),
+            source_url=result["user"]["links"]["html"] or result["links"]["html"],
+            dominant_color=result["color"],
+            width=result["width"],
+            height=result["height"],
+        )
+        db.add(photo)
+        db.flush()
+    grant_asset_if_missing(db, user.id, "photo", photo.id, "reward_search")
+    db.commit()
+    invalidate_user(user.id, "ownership")
     return {"ok": True, "photo": serialize_photo(photo)}
 
 
@@ -565,11 +818,25 @@ def reward_add_quote(
     db.flush()
     grant_asset_if_missing(db, user.id, "quote", quote.id, "reward_quote")
     db.commit()
+    invalidate_user(user.id, "ownership")
+    quote_index.add(quote.id, quote.text, quote.category, quote.origin)
     return {"ok": True, "quote": serialize_quote(quote)}
 
 
 @app.get("/dashboard/summary")
-def dashboard_summary(user: User = Depends(require_user), db: Session = Depends(get_db)):
+def dashboard_summary(user: User = Depends(require_user), db: Session = Depends(get_read_db)):
+    return cache.get_or_set(
+        user_namespace("dashboard", user.id),
+        "summary",
+        lambda: build_dashboard_summary(db, user),
+        store=not is_replica(db),
+    )
+
+
+def build_dashboard_summary(db: Session, user: User) -> dict:
+    calendar_rows = db.query(FocusDailyCount.focus_date, FocusDailyCount.focus_count).filter(
+        FocusDailyCount.user_id == user.id
+    ).order_by(FocusDailyCount.focus_date).all()
     focus_count = db.query(func.count(FocusCompletionRecord.id)).join(
         CycleRun, FocusCompletionRecord.run_id == CycleRun.id
     ).filter(CycleRun.user_id == user.id).scalar()
@@ -587,16 +854,15 @@ def dashboard_summary(user: User = Depends(require_user), db: Session = Depends(
         CycleRun.user_id == user.id,
         FocusTaskRecord.task_type == "nottodo",
     ).scalar()
-    calendar_rows = db.query(
-        func.date(FocusCompletionRecord.recorded_at),
-        func.count(FocusCompletionRecord.id),
-    ).join(CycleRun, FocusCompletionRecord.run_id == CycleRun.id).filter(
-        CycleRun.user_id == user.id
-    ).group_by(func.date(FocusCompletionRecord.recorded_at)).all()
+    archived_tasks = db.query(
+        func.sum(ArchivedFocusSummary.todo_count),
+        func.sum(ArchivedFocusSummary.nottodo_count),
+        func.sum(ArchivedFocusSummary.focus_count),
+    ).filter(ArchivedFocusSummary.user_id == user.id).one()
     return {
-        "focusCount": focus_count or 0,
-        "todoCount": todo_count or 0,
-        "nottodoCount": nottodo_count or 0,
+        "focusCount": (focus_count or 0) + (archived_tasks[2] or 0),
+        "todoCount": (todo_count or 0) + (archived_tasks[0] or 0),
+        "nottodoCount": (nottodo_count or 0) + (archived_tasks[1] or 0),
         "focusCalendar": [
             {"date": row[0], "count": row[1]}
             for row in calendar_rows
@@ -604,8 +870,50 @@ def dashboard_summary(user: User = Depends(require_user), db: Session = Depends(
     }
 
 
+@app.get("/dashboard/calendar")
+def dashboard_calendar(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    timezone: Optional[str] = None,
+    user: User = Depends(require_user),
+    db: Session = Depends(get_read_db),
+):
+    timezone = timezone or user.timezone
+    zone = load_timezone(timezone)
+    if not zone:
+        raise HTTPException(status_code=400, detail="Unknown timezone")
+    start, end = resolve_calendar_range(start, end, zone)
+    if start > end:
+        raise HTTPException(status_code=400, detail="Calendar start must not be after end")
+    if (end - start).days + 1 > MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail="Calendar range is limited to {} days".format(MAX_CALENDAR_DAYS))
+    buckets = cache.get_or_set(
+        user_namespace("dashboard", user.id),
+        "calendar:{}:{}".format(start.isoformat(), end.isoformat()),
+        lambda: calendar_buckets(db, user.id, start, end),
+        store=not is_replica(db),
+    )
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "timezone": timezone,
+        "days": buckets["days"],
+        "quartiles": buckets["quartiles"],
+        "total": buckets["total"],
+    }
+
+
 @app.get("/collection")
-def collection(user: User = Depends(require_user), db: Session = Depends(get_db)):
+def collection(user: User = Depends(require_user), db: Session = Depends(get_read_db)):
+    return cache.get_or_set(
+        user_namespace("collection", user.id),
+        "items",
+        lambda: build_collection(db, user),
+        store=not is_replica(db),
+    )
+
+
+def build_collection(db: Session, user: User) -> dict:
     items = db.query(CollectionCycle).filter(CollectionCycle.user_id == user.id).order_by(
         CollectionCycle.collected_at.desc()
     ).all()
@@ -617,6 +925,7 @@ def collection(user: User = Depends(require_user), db: Session = Depends(get_db)
                 "id": item.id,
                 "name": blueprint.name,
                 "collectedAt": item.collected_at.isoformat(),
+                "mosaicUrl": "/uploads/{}".format(item.mosaic_key) if item.mosaic_key else None,
                 "focusNodes": [
                     {
                         "photo": serialize_photo(node.photo),
@@ -627,3 +936,57 @@ def collection(user: User = Depends(require_user), db: Session = Depends(get_db)
             }
         )
     return {"items": payload}
+
+
+@app.get("/admin/profiles")
+def list_profiles(user: User = Depends(require_admin), enabled: None = Depends(require_profiling)):
+    return {"items": profile_store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(
+    profile_id: str,
+    format: str = "text",
+    user: User = Depends(require_admin),
+    enabled: None = Depends(require_profiling),
+):
+    record = profile_store.get(profile_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "pstats":
+        return Response(
+            profile_dump(record),
+            media_type="application/octet-stream",
+            headers={"content-disposition": 'attachment; filename="{}.prof"'.format(profile_id)},
+        )
+    return PlainTextResponse(profile_report(record))
+
+
+@app.get("/admin/profiling/stacks")
+def profile_stacks(
+    seconds: float = 10,
+    interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS,
+    user: User = Depends(require_admin),
+    enabled: None = Depends(require_profiling),
+):
+    try:
+        counts = sample_stacks(seconds, interval_ms)
+    except RuntimeError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    return PlainTextResponse(format_collapsed(counts))
+
+
+@app.get("/admin/analytics")
+def admin_analytics(
+    days: int = DEFAULT_ANALYTICS_DAYS,
+    user: User = Depends(require_admin),
+    db: Session = Depends(get_read_db),
+):
+    if days < 1 or days > MAX_ANALYTICS_DAYS:
+        raise HTTPException(status_code=400, detail="Analytics range must be 1-{} days".format(MAX_ANALYTICS_DAYS))
+    return analytics_overview(db, days=days)
+
+
+@app.get("/admin/rate-limits")
+def admin_rate_limits(user: User = Depends(require_admin)):
+    return dict(rate_limiter.snapshot(), enabled=RATE_LIMIT_ENABLED)
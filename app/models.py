@@ -1,12 +1,15 @@
 from datetime import datetime
 
+from sqlalchemy import BigInteger
 from sqlalchemy import Boolean
 from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Text
+from sqlalchemy import UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -23,6 +26,7 @@ class User(Base):
     email = Column(String(255), unique=True, nullable=False)
     nickname = Column(String(255), nullable=False)
     profile_image_url = Column(String(500), nullable=True)
+    timezone = Column(String(64), default="UTC", server_default="UTC", nullable=False)
     created_at = Column(DateTime, default=utcnow, nullable=False)
     last_login_at = Column(DateTime, default=utcnow, nullable=False)
 
@@ -46,6 +50,14 @@ class Photo(Base):
     storage_key = Column(String(500), nullable=False)
     source_label = Column(String(255), nullable=False)
     source_url = Column(String(500), nullable=True)
+    placeholder = Column(Text, nullable=True)
+    dominant_color = Column(String(7), nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    byte_size = Column(Integer, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
+    file_mtime = Column(BigInteger, nullable=True)
+    thumbnail_key = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=utcnow, nullable=False)
 
 
@@ -57,6 +69,7 @@ class Quote(Base):
     text = Column(Text, nullable=False)
     author_name = Column(String(255), nullable=False)
     category = Column(String(100), nullable=True)
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)
     created_at = Column(DateTime, default=utcnow, nullable=False)
 
 
@@ -136,9 +149,10 @@ class CycleBreakEdge(Base):
 
 class CycleRun(Base):
     __tablename__ = "cycle_runs"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     cycle_blueprint_id = Column(Integer, ForeignKey("cycle_blueprints.id"), nullable=False)
     cycle_mode = Column(String(50), nullable=False)
     status = Column(String(50), nullable=False)
@@ -151,6 +165,10 @@ class CycleRun(Base):
 
 class FocusCompletionRecord(Base):
     __tablename__ = "focus_completion_records"
+    __table_args__ = (
+        Index("ix_focus_completion_records_run_local_date", "run_id", "local_date"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True)
     run_id = Column(Integer, ForeignKey("cycle_runs.id"), nullable=False)
@@ -159,19 +177,32 @@ class FocusCompletionRecord(Base):
     quote_id = Column(Integer, ForeignKey("quotes.id"), nullable=False)
     focus_duration_seconds = Column(Integer, nullable=False)
     recorded_at = Column(DateTime, default=utcnow, nullable=False)
+    local_date = Column(String(10), nullable=True, index=True)
+
+
+class TaskVocabulary(Base):
+    __tablename__ = "task_vocabulary"
+    __table_args__ = (UniqueConstraint("user_id", "content"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
 
 
 class FocusTaskRecord(Base):
     __tablename__ = "focus_task_records"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True)
     focus_completion_record_id = Column(Integer, ForeignKey("focus_completion_records.id"), nullable=False)
     task_type = Column(String(50), nullable=False)
-    content = Column(Text, nullable=False)
+    task_id = Column(Integer, ForeignKey("task_vocabulary.id"), nullable=True)
 
 
 class RewardEntitlement(Base):
     __tablename__ = "reward_entitlements"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True)
     run_id = Column(Integer, ForeignKey("cycle_runs.id"), nullable=False)
@@ -190,3 +221,87 @@ class CollectionCycle(Base):
     cycle_blueprint_id = Column(Integer, ForeignKey("cycle_blueprints.id"), nullable=False)
     source_run_id = Column(Integer, ForeignKey("cycle_runs.id"), nullable=False)
     collected_at = Column(DateTime, default=utcnow, nullable=False)
+    mosaic_key = Column(String(255), nullable=True)
+
+
+class ArchivedFocusSummary(Base):
+    __tablename__ = "archived_focus_summaries"
+    __table_args__ = (UniqueConstraint("user_id", "focus_date"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    focus_date = Column(String(10), nullable=False)
+    focus_count = Column(Integer, default=0, nullable=False)
+    todo_count = Column(Integer, default=0, nullable=False)
+    nottodo_count = Column(Integer, default=0, nullable=False)
+    archived_at = Column(DateTime, default=utcnow, onupdate=utcnow, nullable=False)
+
+
+class FocusDailyCount(Base):
+    __tablename__ = "focus_daily_counts"
+    __table_args__ = (UniqueConstraint("user_id", "focus_date"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    focus_date = Column(String(10), nullable=False)
+    focus_count = Column(Integer, default=0, nullable=False)
+
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)
+    payload_json = Column(Text, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    status = Column(String(20), default="queued", nullable=False, index=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=5, nullable=False)
+    run_after = Column(DateTime, default=utcnow, nullable=False, index=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class AnalyticsDailyTotal(Base):
+    __tablename__ = "analytics_daily_totals"
+
+    id = Column(Integer, primary_key=True)
+    activity_date = Column(String(10), unique=True, nullable=False)
+    active_users = Column(Integer, default=0, nullable=False)
+    focus_count = Column(Integer, default=0, nullable=False)
+    task_count = Column(Integer, default=0, nullable=False)
+
+
+class AnalyticsDailyUser(Base):
+    __tablename__ = "analytics_daily_users"
+    __table_args__ = (UniqueConstraint("activity_date", "user_id"),)
+
+    id = Column(Integer, primary_key=True)
+    activity_date = Column(String(10), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+
+class AnalyticsBlueprintTotal(Base):
+    __tablename__ = "analytics_blueprint_totals"
+
+    id = Column(Integer, primary_key=True)
+    cycle_blueprint_id = Column(Integer, ForeignKey("cycle_blueprints.id"), unique=True, nullable=False)
+    runs_started = Column(Integer, default=0, nullable=False)
+    runs_completed = Column(Integer, default=0, nullable=False)
+    runs_stopped = Column(Integer, default=0, nullable=False)
+    trial_runs = Column(Integer, default=0, nullable=False)
+    trial_rewards = Column(Integer, default=0, nullable=False)
+    trial_claims = Column(Integer, default=0, nullable=False)
+
+
+class PrunedRunTotal(Base):
+    __tablename__ = "pruned_run_totals"
+    __table_args__ = (UniqueConstraint("cycle_blueprint_id", "cycle_mode", "status"),)
+
+    id = Column(Integer, primary_key=True)
+    cycle_blueprint_id = Column(Integer, ForeignKey("cycle_blueprints.id"), nullable=False)
+    cycle_mode = Column(String(50), nullable=False)
+    status = Column(String(50), nullable=False)
+    run_count = Column(Integer, default=0, nullable=False)
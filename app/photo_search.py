@@ -0,0 +1,137 @@
+import math
+import os
+import threading
+from typing import Optional
+
+from app.cache import cache
+from app.config import PHOTO_CATALOG_PATH
+from app.config import PHOTO_SEARCH_PROVIDER
+from app.quotes import iter_json_array
+from app.recommend import tokenize
+
+
+DEFAULT_PER_PAGE = 10
+MAX_PER_PAGE = 30
+SEARCH_CACHE_TTL_SECONDS = 600
+TAG_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+UTM_SUFFIX = "utm_source=pure_focus&utm_medium=referral"
+
+
+def with_referral(url: str) -> str:
+    if not url:
+        return url
+    return "{}{}{}".format(url, "&" if "?" in url else "?", UTM_SUFFIX)
+
+
+def catalog_tags(item: dict) -> list:
+    return [tag.get("title", "") if isinstance(tag, dict) else str(tag) for tag in item.get("tags") or []]
+
+
+def serialize_search_photo(item: dict) -> dict:
+    user = item.get("user") or {}
+    return {
+        "id": item["id"],
+        "description": item.get("description") or item.get("alt_description"),
+        "width": item.get("width"),
+        "height": item.get("height"),
+        "color": item.get("color"),
+        "urls": item.get("urls") or {},
+        "links": {"html": with_referral((item.get("links") or {}).get("html"))},
+        "user": {
+            "name": user.get("name"),
+            "username": user.get("username"),
+            "links": {"html": with_referral((user.get("links") or {}).get("html"))},
+        },
+        "tags": [{"title": title} for title in catalog_tags(item)],
+    }
+
+
+class LocalPhotoProvider:
+    name = "local"
+
+    def __init__(self, path: str = PHOTO_CATALOG_PATH):
+        self.path = path
+        self.items = {}
+        self.postings = {}
+        self.loaded_mtime = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        with self._lock:
+            if mtime == self.loaded_mtime:
+                return
+            items = {}
+            postings = {}
+            if mtime is not None:
+                with open(self.path, "r", encoding="utf-8") as handle:
+                    for item in iter_json_array(handle, key="results"):
+                        if not item.get("id") or not (item.get("urls") or {}).get("regular"):
+                            continue
+                        items[item["id"]] = item
+                        weights = {}
+                        for token in tokenize(" ".join(catalog_tags(item))):
+                            weights[token] = weights.get(token, 0.0) + TAG_WEIGHT
+                        description = " ".join([item.get("description") or "", item.get("alt_description") or ""])
+                        for token in tokenize(description):
+                            weights[token] = weights.get(token, 0.0) + DESCRIPTION_WEIGHT
+                        for token, weight in weights.items():
+                            postings.setdefault(token, []).append((item["id"], weight))
+            self.items = items
+            self.postings = postings
+            self.loaded_mtime = mtime
+
+    def version(self) -> str:
+        self.load()
+        return str(self.loaded_mtime)
+
+    def search(self, query: str, page: int = 1, per_page: int = DEFAULT_PER_PAGE) -> dict:
+        self.load()
+        scores = {}
+        for token in set(tokenize(query)):
+            postings = self.postings.get(token, [])
+            if not postings:
+                continue
+            idf = math.log(1 + len(self.items) / len(postings))
+            for photo_id, weight in postings:
+                scores[photo_id] = scores.get(photo_id, 0.0) + weight * idf
+        ranked = sorted(
+            scores,
+            key=lambda photo_id: (-scores[photo_id], -(self.items[photo_id].get("likes") or 0), photo_id),
+        )
+        offset = (page - 1) * per_page
+        return {
+            "total": len(ranked),
+            "total_pages": int(math.ceil(len(ranked) / float(per_page))),
+            "results": [serialize_search_photo(self.items[photo_id]) for photo_id in ranked[offset:offset + per_page]],
+        }
+
+    def get(self, photo_id: str) -> Optional[dict]:
+        self.load()
+        item = self.items.get(photo_id)
+        return serialize_search_photo(item) if item else None
+
+
+def build_photo_provider(name: str = PHOTO_SEARCH_PROVIDER):
+    if name == "local":
+        return LocalPhotoProvider()
+    raise ValueError("Unknown photo search provider: {}".format(name))
+
+
+photo_provider = build_photo_provider()
+
+
+def search_photos(query: str, page: int = 1, per_page: int = DEFAULT_PER_PAGE) -> dict:
+    query = " ".join(query.split()).lower()
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+    page = max(page, 1)
+    return cache.get_or_set(
+        "photo_search:{}".format(photo_provider.name),
+        "{}|{}|{}|{}".format(photo_provider.version(), query, page, per_page),
+        lambda: photo_provider.search(query, page=page, per_page=per_page),
+        ttl_seconds=SEARCH_CACHE_TTL_SECONDS,
+    )
@@ -0,0 +1,351 @@
+import argparse
+import base64
+import hashlib
+import io
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from typing import Tuple
+
+from PIL import Image
+from PIL import ImageFilter
+from PIL import ImageOps
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.responses import StreamingResponse
+
+from app.config import SAMPLE_DIR
+from app.config import UPLOAD_DIR
+from app.database import SessionLocal
+from app.database import engine
+from app.database import prepare_schema
+from app.models import Photo
+
+
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_BLUR_RADIUS = 2
+PLACEHOLDER_QUALITY = 50
+RANGE_CHUNK_SIZE = 64 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+PHOTO_BATCH_SIZE = 200
+THUMBNAIL_DIR = "thumbs"
+THUMBNAIL_SIZE = (320, 200)
+THUMBNAIL_QUALITY = 72
+MOSAIC_TILE_SIZE = (160, 100)
+MOSAIC_COLUMNS = 4
+MOSAIC_QUALITY = 70
+
+
+def photo_display_name(filename: str) -> str:
+    base_name = os.path.splitext(filename)[0]
+    if base_name.endswith("-unsplash"):
+        base_name = base_name[: -len("-unsplash")]
+    parts = [part for part in base_name.split("-") if part]
+    cleaned_parts = []
+    for part in parts:
+        if any(character.isdigit() for character in part):
+            break
+        cleaned_parts.append(part.capitalize())
+    if not cleaned_parts:
+        cleaned_parts = [base_name.replace("-", " ").title()]
+    return " ".join(cleaned_parts)
+
+
+def photo_file_path(photo: Photo) -> str:
+    directory = SAMPLE_DIR if photo.origin == "sample" else UPLOAD_DIR
+    return os.path.join(directory, photo.storage_key)
+
+
+def compute_placeholder(image) -> Tuple[str, str]:
+    image = image.convert("RGB")
+    red, green, blue = image.resize((1, 1), Image.BILINEAR).getpixel((0, 0))
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    image = image.filter(ImageFilter.GaussianBlur(PLACEHOLDER_BLUR_RADIUS))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=PLACEHOLDER_QUALITY)
+    placeholder = "data:image/jpeg;base64,{}".format(base64.b64encode(buffer.getvalue()).decode("ascii"))
+    return placeholder, "#{:02x}{:02x}{:02x}".format(red, green, blue)
+
+
+def file_content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_photo_metadata(path: str) -> dict:
+    stat_result = os.stat(path)
+    metadata = {
+        "byte_size": stat_result.st_size,
+        "file_mtime": stat_result.st_mtime_ns,
+        "content_hash": file_content_hash(path),
+        "width": None,
+        "height": None,
+        "placeholder": None,
+        "dominant_color": None,
+    }
+    try:
+        with Image.open(path) as image:
+            metadata["width"], metadata["height"] = image.size
+            metadata["placeholder"], metadata["dominant_color"] = compute_placeholder(image)
+    except (OSError, ValueError):
+        pass
+    return metadata
+
+
+def apply_photo_metadata(photo: Photo):
+    for key, value in extract_photo_metadata(photo_file_path(photo)).items():
+        setattr(photo, key, value)
+
+
+def photo_thumbnail_key(photo: Photo) -> Optional[str]:
+    if photo.origin not in ("sample", "user_upload") or not photo.content_hash:
+        return None
+    return "{}/photo-{}-{}.jpg".format(THUMBNAIL_DIR, photo.id, photo.content_hash[:12])
+
+
+def save_image_atomically(image: Image.Image, path: str, quality: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+    try:
+        image.save(temporary_path, format="JPEG", quality=quality, optimize=True)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def ensure_photo_thumbnail(photo: Photo) -> Optional[str]:
+    key = photo_thumbnail_key(photo)
+    if key is None:
+        return None
+    path = os.path.join(UPLOAD_DIR, key)
+    if photo.thumbnail_key != key or not os.path.exists(path):
+        try:
+            with Image.open(photo_file_path(photo)) as image:
+                thumbnail = ImageOps.fit(image.convert("RGB"), THUMBNAIL_SIZE, Image.LANCZOS)
+        except OSError:
+            photo.thumbnail_key = None
+            return None
+        save_image_atomically(thumbnail, path, quality=THUMBNAIL_QUALITY)
+        photo.thumbnail_key = key
+    return key
+
+
+def mosaic_key(cycle_blueprint_id: int, photos: list) -> str:
+    digest = hashlib.sha256(
+        "|".join("{}:{}".format(photo.id, photo.content_hash or photo.storage_key) for photo in photos).encode("utf-8")
+    ).hexdigest()
+    return "{}/cycle-{}-{}.jpg".format(THUMBNAIL_DIR, cycle_blueprint_id, digest[:12])
+
+
+def build_mosaic(photos: list, key: str) -> str:
+    columns = min(max(len(photos), 1), MOSAIC_COLUMNS)
+    rows = (len(photos) + columns - 1) // columns or 1
+    tile_width, tile_height = MOSAIC_TILE_SIZE
+    mosaic = Image.new("RGB", (columns * tile_width, rows * tile_height), (24, 24, 24))
+    for index, photo in enumerate(photos):
+        origin = ((index % columns) * tile_width, (index // columns) * tile_height)
+        tile = None
+        if photo.thumbnail_key:
+            try:
+                with Image.open(os.path.join(UPLOAD_DIR, photo.thumbnail_key)) as image:
+                    tile = ImageOps.fit(image, MOSAIC_TILE_SIZE, Image.LANCZOS)
+            except OSError:
+                tile = None
+        if tile is not None:
+            mosaic.paste(tile, origin)
+        elif photo.dominant_color:
+            mosaic.paste(photo.dominant_color, origin + (origin[0] + tile_width, origin[1] + tile_height))
+    save_image_atomically(mosaic, os.path.join(UPLOAD_DIR, key), quality=MOSAIC_QUALITY)
+    return key
+
+
+def scan_photo_files(directory: str, base_dir: str = SAMPLE_DIR, recursive: bool = True) -> list:
+    results = []
+    for root, dirnames, filenames in os.walk(directory):
+        if recursive:
+            dirnames.sort()
+        else:
+            dirnames.clear()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            storage_key = os.path.relpath(path, base_dir).replace(os.sep, "/")
+            stat_result = os.stat(path)
+            results.append((storage_key, path, stat_result.st_size, stat_result.st_mtime_ns))
+    return results
+
+
+def import_photo_directory(
+    db: Session,
+    directory: str = SAMPLE_DIR,
+    origin: str = "sample",
+    base_dir: str = SAMPLE_DIR,
+    workers: int = None,
+    use_processes: bool = False,
+    batch_size: int = PHOTO_BATCH_SIZE,
+    recursive: bool = True,
+) -> dict:
+    started = time.perf_counter()
+    files = scan_photo_files(directory, base_dir, recursive)
+    existing = dict(
+        (row.storage_key, row)
+        for row in db.query(
+            Photo.id,
+            Photo.storage_key,
+            Photo.source_label,
+            Photo.byte_size,
+            Photo.file_mtime,
+            Photo.content_hash,
+        ).filter(Photo.origin == origin).all()
+    )
+    stats = {"scanned": len(files), "inserted": 0, "updated": 0, "unchanged": 0}
+    pending = []
+    for storage_key, path, byte_size, file_mtime in files:
+        row = existing.get(storage_key)
+        label = photo_display_name(os.path.basename(storage_key))
+        if row and row.byte_size == byte_size and row.file_mtime == file_mtime and row.source_label == label:
+            stats["unchanged"] += 1
+            continue
+        pending.append((storage_key, path, row, label))
+
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=workers or os.cpu_count() or 1) as executor:
+        results = executor.map(extract_photo_metadata, [item[1] for item in pending], chunksize=8)
+        inserts = []
+        updates = []
+        for (storage_key, path, row, label), metadata in zip(pending, results):
+            if row:
+                if row.content_hash == metadata["content_hash"] and row.source_label == label:
+                    metadata = {"byte_size": metadata["byte_size"], "file_mtime": metadata["file_mtime"]}
+                metadata.update({"id": row.id, "source_label": label})
+                updates.append(metadata)
+            else:
+                metadata.update({
+                    "origin": origin,
+                    "storage_key": storage_key,
+                    "source_label": label,
+                    "source_url": "https://unsplash.com",
+                })
+                inserts.append(metadata)
+            if len(inserts) + len(updates) >= batch_size:
+                flush_photo_batch(db, inserts, updates, stats)
+                inserts, updates = [], []
+        flush_photo_batch(db, inserts, updates, stats)
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def flush_photo_batch(db: Session, inserts: list, updates: list, stats: dict):
+    if inserts:
+        db.bulk_insert_mappings(Photo, inserts)
+    if updates:
+        db.bulk_update_mappings(Photo, updates)
+    db.commit()
+    stats["inserted"] += len(inserts)
+    stats["updated"] += len(updates)
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if last and end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path: str, start: int, end: int):
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = handle.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class PhotoFiles(StaticFiles):
+    def __init__(self, *args, max_age: int = 86400, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code=status_code)
+        response.headers["accept-ranges"] = "bytes"
+        response.headers["cache-control"] = "public, max-age={}".format(self.max_age)
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if response.status_code != 200 or not range_header or scope["method"] != "GET":
+            return response
+        if_range = request_headers.get("if-range")
+        if if_range and if_range not in (response.headers.get("etag"), response.headers.get("last-modified")):
+            return response
+        size = stat_result.st_size
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range is None:
+            return response
+        start, end = byte_range
+        if start >= size:
+            return Response(status_code=416, headers={"content-range": "bytes */{}".format(size)})
+        headers = dict(
+            (key, value)
+            for key, value in response.headers.items()
+            if key in ("etag", "last-modified", "accept-ranges", "cache-control")
+        )
+        headers["content-range"] = "bytes {}-{}/{}".format(start, end, size)
+        headers["content-length"] = str(end - start + 1)
+        return StreamingResponse(
+            iter_file_range(full_path, start, end),
+            status_code=206,
+            headers=headers,
+            media_type=response.media_type,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a directory of background photos into the catalog.")
+    parser.add_argument("--directory", default=SAMPLE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", action="store_true", help="use threads instead of worker processes")
+    args = parser.parse_args()
+    directory = os.path.abspath(args.directory)
+    if os.path.commonpath([directory, SAMPLE_DIR]) != SAMPLE_DIR:
+        parser.error("photos must live under {} so they can be served".format(SAMPLE_DIR))
+    prepare_schema(engine)
+    db = SessionLocal()
+    try:
+        stats = import_photo_directory(db, directory, workers=args.workers, use_processes=not args.threads)
+    finally:
+        db.close()
+    print(
+        "scanned {scanned} photos: inserted {inserted}, updated {updated}, "
+        "unchanged {unchanged} in {seconds:.2f}s".format(**stats)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import cProfile
+import contextvars
+import functools
+import inspect
+import io
+import marshal
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from collections import deque
+from datetime import datetime
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.config import PROFILE_HISTORY
+
+
+PROFILE_HEADER = "x-profile"
+DEFAULT_SAMPLE_INTERVAL_MS = 5
+MAX_SAMPLE_SECONDS = 60
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 10
+SQL_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+\"?(\w+)", re.IGNORECASE)
+
+active_profile = contextvars.ContextVar("active_profile", default=None)
+active_sql = contextvars.ContextVar("active_sql", default=None)
+statements_in_flight = {}
+sampling_lock = threading.Lock()
+
+
+def sql_label(statement: str) -> str:
+    words = statement.split(None, 1)
+    verb = words[0].upper() if words else "SQL"
+    table = SQL_TABLE_PATTERN.search(statement)
+    return "sql:{} {}".format(verb, table.group(1)) if table else "sql:{}".format(verb)
+
+
+class SQLTimings:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self.statement_seconds = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        self.statement_seconds[statement] += seconds
+
+    def summary(self) -> list:
+        return [
+            {"statement": statement, "count": self.statements[statement], "ms": round(seconds * 1000, 3)}
+            for statement, seconds in self.statement_seconds.most_common(TOP_STATEMENTS)
+        ]
+
+
+def install_sql_timing(bind):
+    @event.listens_for(bind, "before_cursor_execute")
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements_in_flight[threading.get_ident()] = statement
+        context.profiling_started = time.perf_counter()
+
+    @event.listens_for(bind, "after_cursor_execute")
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.profiling_started
+        statements_in_flight.pop(threading.get_ident(), None)
+        timings = active_sql.get()
+        if timings is not None:
+            timings.record(statement, elapsed)
+
+    @event.listens_for(bind, "handle_error")
+    def handle_error(exception_context):
+        statements_in_flight.pop(threading.get_ident(), None)
+
+
+def profiled_endpoint(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = active_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.enable()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.disable()
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = active_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profile.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.disable()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiled_endpoint(endpoint), **kwargs)
+
+
+class ProfileStore:
+    def __init__(self, size: int = PROFILE_HISTORY):
+        self._profiles = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, record: dict):
+        with self._lock:
+            self._profiles.append(record)
+
+    def get(self, profile_id: str):
+        with self._lock:
+            for record in self._profiles:
+                if record["id"] == profile_id:
+                    return record
+        return None
+
+    def list(self) -> list:
+        with self._lock:
+            return [
+                dict((key, value) for key, value in record.items() if key not in ("profile", "sql"))
+                for record in reversed(self._profiles)
+            ]
+
+
+profile_store = ProfileStore()
+
+
+class ProfilingMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, is_allowed):
+        super().__init__(app)
+        self.is_allowed = is_allowed
+
+    async def dispatch(self, request, call_next):
+        if request.headers.get(PROFILE_HEADER) != "1" or not await run_in_threadpool(self.is_allowed, request):
+            return await call_next(request)
+        profile = cProfile.Profile()
+        timings = SQLTimings()
+        profile_token = active_profile.set(profile)
+        sql_token = active_sql.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            active_profile.reset(profile_token)
+            active_sql.reset(sql_token)
+        elapsed = time.perf_counter() - started
+        record = {
+            "id": uuid.uuid4().hex[:12],
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "durationMs": round(elapsed * 1000, 3),
+            "sqlMs": round(timings.seconds * 1000, 3),
+            "sqlCount": timings.count,
+            "createdAt": datetime.utcnow().isoformat(),
+            "profile": profile,
+            "sql": timings,
+        }
+        profile_store.add(record)
+        response.headers["x-profile-id"] = record["id"]
+        response.headers["server-timing"] = 'app;dur={}, sql;dur={};desc="{} queries"'.format(
+            record["durationMs"], record["sqlMs"], record["sqlCount"]
+        )
+        return response
+
+
+def profile_report(record: dict) -> str:
+    output = io.StringIO()
+    output.write("{method} {path} -> {status} in {durationMs} ms ({sqlCount} queries, {sqlMs} ms SQL)\n\n".format(**record))
+    stats = pstats.Stats(record["profile"], stream=output)
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    output.write("Slowest SQL statements\n")
+    for item in record["sql"].summary():
+        output.write("{ms:>10} ms  x{count:<4} {statement}\n".format(**item))
+    return output.getvalue()
+
+
+def profile_dump(record: dict) -> bytes:
+    record["profile"].create_stats()
+    return marshal.dumps(record["profile"].stats)
+
+
+def frame_label(frame) -> str:
+    return "{}.{}".format(frame.f_globals.get("__name__", "?"), frame.f_code.co_name)
+
+
+def collapsed_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def sample_stacks(seconds: float, interval_ms: float = DEFAULT_SAMPLE_INTERVAL_MS) -> Counter:
+    if not sampling_lock.acquire(blocking=False):
+        raise RuntimeError("A sampling window is already running")
+    try:
+        counts = Counter()
+        own_thread = threading.get_ident()
+        thread_names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        interval = max(interval_ms, 1) / 1000.0
+        deadline = time.perf_counter() + min(seconds, MAX_SAMPLE_SECONDS)
+        while time.perf_counter() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = [thread_names.get(thread_id, "thread-{}".format(thread_id))] + collapsed_stack(frame)
+                statement = statements_in_flight.get(thread_id)
+                if statement:
+                    stack.append(sql_label(statement))
+                counts[";".join(stack)] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        sampling_lock.release()
+
+
+def format_collapsed(counts: Counter) -> str:
+    return "".join("{} {}\n".format(stack, count) for stack, count in sorted(counts.items()))
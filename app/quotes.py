@@ -0,0 +1,201 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.database import engine
+from app.database import prepare_schema
+from app.models import Quote
+
+
+QUOTE_BATCH_SIZE = 500
+READ_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\r\n"
+
+
+def normalize_text(value: str) -> str:
+    return " ".join(value.split())
+
+
+def quote_hash(text: str, author_name: str) -> str:
+    key = "{}\x1f{}".format(normalize_text(text).casefold(), normalize_text(author_name).casefold())
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def iter_ndjson(handle) -> Iterator[dict]:
+    for line in handle:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_json_array(handle, key: str = "quotes") -> Iterator[dict]:
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = handle.read(READ_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    def peek() -> str:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+            if position < len(buffer) or eof:
+                return buffer[position:position + 1]
+            fill()
+
+    def decode():
+        nonlocal position
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            position = end
+            return value
+
+    token = peek()
+    if token == "{":
+        position += 1
+        while True:
+            token = peek()
+            if token in ("}", ""):
+                return
+            if token == ",":
+                position += 1
+                continue
+            name = decode()
+            if peek() != ":":
+                raise ValueError("Expected ':' after object key {!r}".format(name))
+            position += 1
+            if peek() == "[" and name == key:
+                break
+            decode()
+    elif token != "[":
+        return
+    position += 1
+
+    while True:
+        token = peek()
+        if not token:
+            raise ValueError("Unterminated quote array")
+        if token == ",":
+            position += 1
+            continue
+        if token == "]":
+            return
+        yield decode()
+        if position > READ_CHUNK_SIZE:
+            buffer = buffer[position:]
+            position = 0
+
+
+def iter_quote_items(path: str) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as handle:
+        if path.endswith((".ndjson", ".jsonl")):
+            yield from iter_ndjson(handle)
+        else:
+            yield from iter_json_array(handle)
+
+
+def quote_row(item: dict, origin: str):
+    text = normalize_text(item.get("quote") or item.get("text") or "")
+    author_name = normalize_text(item.get("speaker") or item.get("author") or "")
+    if not text or not author_name:
+        return None
+    return {
+        "origin": origin,
+        "text": text,
+        "author_name": author_name,
+        "category": item.get("category"),
+        "content_hash": quote_hash(text, author_name),
+    }
+
+
+def insert_quote_batch(db: Session, rows: list) -> int:
+    unique_rows = dict((row["content_hash"], row) for row in rows)
+    existing = db.query(Quote.content_hash).filter(Quote.content_hash.in_(list(unique_rows))).all()
+    for row in existing:
+        unique_rows.pop(row[0], None)
+    if unique_rows:
+        db.bulk_insert_mappings(Quote, list(unique_rows.values()))
+    db.commit()
+    return len(unique_rows)
+
+
+def ingest_quotes(db: Session, path: str, origin: str = "sample", batch_size: int = QUOTE_BATCH_SIZE) -> dict:
+    started = time.perf_counter()
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "skipped": 0}
+    batch = []
+    for item in iter_quote_items(path):
+        stats["read"] += 1
+        row = quote_row(item, origin)
+        if not row:
+            stats["skipped"] += 1
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            stats["inserted"] += insert_quote_batch(db, batch)
+            batch = []
+    if batch:
+        stats["inserted"] += insert_quote_batch(db, batch)
+    stats["duplicates"] = stats["read"] - stats["skipped"] - stats["inserted"]
+    stats["seconds"] = time.perf_counter() - started
+    stats["rowsPerSecond"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def backfill_quote_hashes(db: Session):
+    quotes = db.query(Quote).filter(Quote.origin != "user_input", Quote.content_hash.is_(None)).all()
+    if not quotes:
+        return
+    taken = set([row[0] for row in db.query(Quote.content_hash).filter(Quote.content_hash.isnot(None)).all()])
+    for quote in quotes:
+        content_hash = quote_hash(quote.text, quote.author_name)
+        if content_hash not in taken:
+            quote.content_hash = content_hash
+            taken.add(content_hash)
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a JSON or NDJSON quote catalog into the database.")
+    parser.add_argument("path")
+    parser.add_argument("--origin", default="sample")
+    parser.add_argument("--batch-size", type=int, default=QUOTE_BATCH_SIZE)
+    args = parser.parse_args()
+    prepare_schema(engine)
+    db = SessionLocal()
+    try:
+        backfill_quote_hashes(db)
+        stats = ingest_quotes(db, os.path.abspath(args.path), origin=args.origin, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(
+        "read {read} quotes, inserted {inserted}, duplicates {duplicates}, skipped {skipped} "
+        "in {seconds:.2f}s ({rowsPerSecond:.0f} rows/sec)".format(**stats)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import math
+import re
+import threading
+import time
+from typing import Optional
+
+from starlette.responses import JSONResponse
+
+from app.config import RATE_LIMIT_UPLOAD_BURST
+from app.config import RATE_LIMIT_UPLOAD_PER_SECOND
+from app.config import RATE_LIMIT_WRITE_BURST
+from app.config import RATE_LIMIT_WRITE_PER_SECOND
+from app.config import SHED_MAX_IN_FLIGHT
+from app.config import SHED_MAX_WRITES_IN_FLIGHT
+from app.database import SAFE_METHODS
+
+
+UNLIMITED_PREFIXES = ("/static/", "/sample/", "/uploads/")
+SHED_EXEMPT_PREFIXES = ("/admin/",)
+SHED_RETRY_SECONDS = 1
+MAX_BUCKETS = 10000
+UPLOAD_ROUTES = (
+    ("POST", re.compile(r"^/rewards/[^/]+/upload-photo$")),
+)
+
+
+def route_class_for(scope) -> str:
+    if scope["method"] in SAFE_METHODS:
+        return "read"
+    for method, pattern in UPLOAD_ROUTES:
+        if scope["method"] == method and pattern.match(scope["path"]):
+            return "upload"
+    return "write"
+
+
+def client_key(scope) -> str:
+    user_id = (scope.get("session") or {}).get("user_id")
+    if user_id:
+        return "user:{}".format(user_id)
+    client = scope.get("client")
+    return "ip:{}".format(client[0] if client else "unknown")
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        budgets: dict,
+        max_in_flight: int = SHED_MAX_IN_FLIGHT,
+        max_writes_in_flight: int = SHED_MAX_WRITES_IN_FLIGHT,
+        max_buckets: int = MAX_BUCKETS,
+        clock=time.monotonic,
+    ):
+        self.budgets = budgets
+        self.max_in_flight = max_in_flight
+        self.max_writes_in_flight = max_writes_in_flight
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.buckets = {}
+            self.rejections = {}
+            self.in_flight = 0
+            self.writes_in_flight = 0
+
+    def _take(self, key: str, route_class: str, now: float) -> float:
+        capacity, per_second = self.budgets[route_class]
+        tokens, updated = self.buckets.get((route_class, key), (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * per_second)
+        if tokens >= 1:
+            self.buckets[(route_class, key)] = (tokens - 1, now)
+            if len(self.buckets) > self.max_buckets:
+                self._prune(now)
+            return 0.0
+        self.buckets[(route_class, key)] = (tokens, now)
+        return (1 - tokens) / per_second
+
+    def _prune(self, now: float):
+        for bucket_key, (tokens, updated) in list(self.buckets.items()):
+            capacity, per_second = self.budgets[bucket_key[0]]
+            if tokens + (now - updated) * per_second >= capacity:
+                del self.buckets[bucket_key]
+
+    def _reject(self, reason: str, route_class: str):
+        counts = self.rejections.setdefault(reason, {})
+        counts[route_class] = counts.get(route_class, 0) + 1
+
+    def admit(self, scope, route_class: str) -> Optional[JSONResponse]:
+        with self._lock:
+            if not scope["path"].startswith(SHED_EXEMPT_PREFIXES) and (
+                self.in_flight >= self.max_in_flight
+                or (route_class != "read" and self.writes_in_flight >= self.max_writes_in_flight)
+            ):
+                self._reject("shed", route_class)
+                return JSONResponse(
+                    {"detail": "Server is busy, please retry"},
+                    status_code=503,
+                    headers={"Retry-After": str(SHED_RETRY_SECONDS)},
+                )
+            if route_class in self.budgets:
+                wait = self._take(client_key(scope), route_class, self.clock())
+                if wait:
+                    self._reject("rate_limited", route_class)
+                    return JSONResponse(
+                        {"detail": "Too many requests, please slow down"},
+                        status_code=429,
+                        headers={"Retry-After": str(max(1, int(math.ceil(wait))))},
+                    )
+            self.in_flight += 1
+            if route_class != "read":
+                self.writes_in_flight += 1
+        return None
+
+    def release(self, route_class: str):
+        with self._lock:
+            self.in_flight -= 1
+            if route_class != "read":
+                self.writes_in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "inFlight": self.in_flight,
+                "writesInFlight": self.writes_in_flight,
+                "maxInFlight": self.max_in_flight,
+                "maxWritesInFlight": self.max_writes_in_flight,
+                "budgets": dict(
+                    (route_class, {"burst": capacity, "perSecond": per_second})
+                    for route_class, (capacity, per_second) in self.budgets.items()
+                ),
+                "trackedBuckets": len(self.buckets),
+                "rejections": dict((reason, dict(counts)) for reason, counts in self.rejections.items()),
+            }
+
+
+# Buckets and in-flight counters live in this process, so with N serve workers a
+# client can get up to N times the configured budget; size the limits per worker.
+rate_limiter = RateLimiter({
+    "write": (RATE_LIMIT_WRITE_BURST, RATE_LIMIT_WRITE_PER_SECOND),
+    "upload": (RATE_LIMIT_UPLOAD_BURST, RATE_LIMIT_UPLOAD_PER_SECOND),
+})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNLIMITED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        route_class = route_class_for(scope)
+        rejection = self.limiter.admit(scope, route_class)
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(route_class)
@@ -0,0 +1,139 @@
+import math
+import re
+import threading
+import zlib
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.models import CycleRun
+from app.models import FocusCompletionRecord
+from app.models import FocusTaskRecord
+from app.models import Quote
+from app.models import TaskVocabulary
+
+
+FEATURE_BUCKETS = 1 << 18
+BM25_K1 = 1.2
+BM25_B = 0.75
+INDEX_LOAD_BATCH = 2000
+RECENT_TASK_LIMIT = 20
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in into is it its me my no not of on or our so "
+    "that the their then there these they this to was we were what when which who will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def feature_counts(text: str) -> dict:
+    tokens = tokenize(text)
+    features = tokens + ["{} {}".format(left, right) for left, right in zip(tokens, tokens[1:])]
+    counts = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode("utf-8")) % FEATURE_BUCKETS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def quote_document(text: str, category: str) -> str:
+    return "{} {}".format(text, category or "")
+
+
+class QuoteIndex:
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self.origins = {}
+        self.total_length = 0
+        self.loaded_through_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def clear(self):
+        with self._lock:
+            self.postings = {}
+            self.lengths = {}
+            self.origins = {}
+            self.total_length = 0
+            self.loaded_through_id = 0
+
+    def add(self, quote_id: int, text: str, category: str = None, origin: str = "sample"):
+        counts = feature_counts(quote_document(text, category))
+        with self._lock:
+            if quote_id in self.lengths:
+                return
+            for bucket, count in counts.items():
+                self.postings.setdefault(bucket, []).append((quote_id, count))
+            length = sum(counts.values())
+            self.lengths[quote_id] = length
+            self.origins[quote_id] = origin
+            self.total_length += length
+
+    def refresh(self, db: Session):
+        while True:
+            rows = db.query(Quote.id, Quote.text, Quote.category, Quote.origin).filter(
+                Quote.id > self.loaded_through_id
+            ).order_by(Quote.id).limit(INDEX_LOAD_BATCH).all()
+            for quote_id, text, category, origin in rows:
+                self.add(quote_id, text, category, origin)
+                self.loaded_through_id = quote_id
+            if len(rows) < INDEX_LOAD_BATCH:
+                return
+
+    def search(self, text: str, limit: int = 5, allowed_private_ids: set = None) -> list:
+        query = feature_counts(text)
+        allowed_private_ids = allowed_private_ids or set()
+        with self._lock:
+            document_count = len(self.lengths)
+            if not document_count or not query:
+                return []
+            average_length = self.total_length / document_count
+            scores = {}
+            for bucket, query_count in query.items():
+                postings = self.postings.get(bucket)
+                if not postings:
+                    continue
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                weight = query_count * idf * (BM25_K1 + 1)
+                for quote_id, count in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[quote_id] / average_length)
+                    scores[quote_id] = scores.get(quote_id, 0.0) + weight * count / (count + norm)
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+            results = []
+            for quote_id, score in ranked:
+                if self.origins[quote_id] == "user_input" and quote_id not in allowed_private_ids:
+                    continue
+                results.append((quote_id, score))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+quote_index = QuoteIndex()
+
+
+def recent_task_text(db: Session, user_id: int, limit: int = RECENT_TASK_LIMIT) -> str:
+    rows = db.query(TaskVocabulary.content).join(
+        FocusTaskRecord, FocusTaskRecord.task_id == TaskVocabulary.id
+    ).join(
+        FocusCompletionRecord,
+        FocusTaskRecord.focus_completion_record_id == FocusCompletionRecord.id,
+    ).join(CycleRun, FocusCompletionRecord.run_id == CycleRun.id).filter(
+        CycleRun.user_id == user_id
+    ).order_by(FocusTaskRecord.id.desc()).limit(limit).all()
+    return " ".join([row[0] for row in rows])
+
+
+def recommend_quotes(db: Session, text: str, limit: int = 5, allowed_private_ids: set = None) -> list:
+    quote_index.refresh(db)
+    ranked = quote_index.search(text, limit=limit, allowed_private_ids=allowed_private_ids)
+    if not ranked:
+        return []
+    quotes = dict((quote.id, quote) for quote in db.query(Quote).filter(Quote.id.in_([item[0] for item in ranked])))
+    return [(quotes[quote_id], score) for quote_id, score in ranked if quote_id in quotes]
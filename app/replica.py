@@ -0,0 +1,149 @@
+import argparse
+import sqlite3
+import threading
+import time
+from datetime import timezone
+
+from fastapi import Request
+from sqlalchemy import func
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+from app.cache import cache
+from app.cache import user_namespace
+from app.config import DATABASE_URL
+from app.config import REPLICA_DATABASE_URL
+from app.database import SAFE_METHODS
+from app.database import ReplicaSessionLocal
+from app.database import SessionLocal
+from app.database import replica_engine
+from app.models import BackgroundJob
+
+
+REPLICA_SYNC_CHECK_SECONDS = 1.0
+replica_sync_state = {"checked_at": None, "synced_at": 0.0}
+replica_sync_lock = threading.Lock()
+
+
+class WriteTrackingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                session = scope.get("session")
+                if session is not None and session.get("user_id"):
+                    session["wrote_at"] = time.time()
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.database == ":memory:":
+        raise ValueError("Replica sync needs file-backed SQLite URLs, got {}".format(url))
+    return parsed.database
+
+
+def sync_replica(primary_url: str = DATABASE_URL, replica_url: str = REPLICA_DATABASE_URL) -> float:
+    started = time.perf_counter()
+    snapshot_at = time.time()
+    source = sqlite3.connect(sqlite_path(primary_url))
+    target = sqlite3.connect(sqlite_path(replica_url))
+    try:
+        source.backup(target)
+        mark_replica_synced(target, snapshot_at)
+    finally:
+        target.close()
+        source.close()
+    return time.perf_counter() - started
+
+
+def mark_replica_synced(connection: sqlite3.Connection, synced_at: float):
+    connection.execute("CREATE TABLE IF NOT EXISTS replica_sync (id INTEGER PRIMARY KEY, synced_at REAL NOT NULL)")
+    connection.execute("INSERT OR REPLACE INTO replica_sync (id, synced_at) VALUES (1, ?)", (synced_at,))
+    connection.commit()
+
+
+def replica_synced_at(bind) -> float:
+    try:
+        with bind.connect() as connection:
+            return connection.execute(text("SELECT synced_at FROM replica_sync WHERE id = 1")).scalar() or 0.0
+    except OperationalError:
+        return 0.0
+
+
+def cached_replica_synced_at(bind) -> float:
+    # An older value only sends more reads to the primary, so a short per-process cache is safe.
+    now = time.monotonic()
+    with replica_sync_lock:
+        checked_at = replica_sync_state["checked_at"]
+        if checked_at is not None and now - checked_at < REPLICA_SYNC_CHECK_SECONDS:
+            return replica_sync_state["synced_at"]
+    synced_at = replica_synced_at(bind)
+    with replica_sync_lock:
+        replica_sync_state.update(checked_at=now, synced_at=synced_at)
+    return synced_at
+
+
+def record_job_write(user_id: int, finished_at: float):
+    # Invalidate first so a concurrent lookup cannot store an older watermark over this one.
+    namespace = user_namespace("jobs", user_id)
+    cache.invalidate(namespace)
+    cache.set(namespace, "finished_at", finished_at)
+
+
+def job_write_at(user_id: int) -> float:
+    def load():
+        db = SessionLocal()
+        try:
+            finished_at = db.query(func.max(BackgroundJob.finished_at)).filter(BackgroundJob.user_id == user_id).scalar()
+        finally:
+            db.close()
+        return finished_at.replace(tzinfo=timezone.utc).timestamp() if finished_at else 0.0
+
+    return cache.get_or_set(user_namespace("jobs", user_id), "finished_at", load)
+
+
+def reads_from_replica(session: dict) -> bool:
+    if replica_engine is None:
+        return False
+    synced_at = cached_replica_synced_at(replica_engine)
+    if synced_at <= session.get("wrote_at", 0):
+        return False
+    # Jobs finish after the request that queued them, so their writes move the user's watermark too.
+    user_id = session.get("user_id")
+    return not user_id or synced_at > job_write_at(user_id)
+
+
+def get_read_db(request: Request):
+    session_factory = ReplicaSessionLocal if reads_from_replica(request.session) else SessionLocal
+    db = session_factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the primary SQLite database onto the local read replica.")
+    parser.add_argument("--interval", type=float, default=0, help="keep syncing every N seconds")
+    args = parser.parse_args()
+    if not REPLICA_DATABASE_URL:
+        parser.error("REPLICA_DATABASE_URL is not set")
+    while True:
+        print("synced replica in {:.3f}s".format(sync_replica()))
+        if args.interval <= 0:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
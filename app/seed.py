@@ -1,8 +1,8 @@
-import json
 import os
 
 from sqlalchemy.orm import Session
 
+from app.cache import invalidate_user
 from app.config import DEMO_EMAIL
 from app.config import DEMO_NAME
 from app.config import SAMPLE_DIR
@@ -14,65 +14,22 @@ from app.models import Quote
 from app.models import User
 from app.models import UserAssetOwnership
 from app.models import UserCycleOwnership
-
-
-def photo_display_name(filename: str) -> str:
-    base_name = os.path.splitext(filename)[0]
-    if base_name.endswith("-unsplash"):
-        base_name = base_name[: -len("-unsplash")]
-    parts = [part for part in base_name.split("-") if part]
-    cleaned_parts = []
-    for part in parts:
-        if any(character.isdigit() for character in part):
-            break
-        cleaned_parts.append(part.capitalize())
-    if not cleaned_parts:
-        cleaned_parts = [base_name.replace("-", " ").title()]
-    return " ".join(cleaned_parts)
+from app.photos import import_photo_directory
+from app.quotes import ingest_quotes
 
 
 def seed_reference_data(db: Session):
-    photo_filenames = sorted(
-        [name for name in os.listdir(SAMPLE_DIR) if name.lower().endswith(".jpg")]
-    )
-    quote_path = os.path.join(SAMPLE_DIR, "quote.json")
-    with open(quote_path, "r", encoding="utf-8") as handle:
-        quote_payload = json.load(handle)
+    # Bulk libraries in subdirectories are imported with `python -m app.photos`.
+    import_photo_directory(db, SAMPLE_DIR, origin="sample", workers=1, recursive=False)
+    if not db.query(Quote.id).filter(Quote.origin == "sample").first():
+        ingest_quotes(db, os.path.join(SAMPLE_DIR, "quote.json"), origin="sample")
 
-    photo_records = []
-    for filename in photo_filenames:
-        display_name = photo_display_name(filename)
-        photo = db.query(Photo).filter(Photo.storage_key == filename).first()
-        if not photo:
-            photo = Photo(
-                origin="sample",
-                storage_key=filename,
-                source_label=display_name,
-                source_url="https://unsplash.com",
-            )
-            db.add(photo)
-            db.flush()
-        elif photo.source_label != display_name:
-            photo.source_label = display_name
-        photo_records.append(photo)
+    photo_records = db.query(Photo).filter(
+        Photo.origin == "sample",
+        ~Photo.storage_key.contains("/"),
+    ).order_by(Photo.storage_key).limit(8).all()
 
-    quote_records = []
-    for item in quote_payload.get("quotes", [])[:8]:
-        quote = db.query(Quote).filter(
-            Quote.origin == "sample",
-            Quote.text == item["quote"],
-            Quote.author_name == item["speaker"],
-        ).first()
-        if not quote:
-            quote = Quote(
-                origin="sample",
-                text=item["quote"],
-                author_name=item["speaker"],
-                category=item.get("category"),
-            )
-            db.add(quote)
-            db.flush()
-        quote_records.append(quote)
+    quote_records = db.query(Quote).filter(Quote.origin == "sample").order_by(Quote.id).limit(8).all()
 
     cycles = [
         ("sample cycle 1", photo_records[:4], quote_records[:4], True, False),
@@ -116,8 +73,10 @@ def seed_reference_data(db: Session):
 
 
 def ensure_user_defaults(db: Session, user: User):
-    seed_reference_data(db)
     owned_cycle = db.query(CycleBlueprint).filter(CycleBlueprint.is_owned_by_default.is_(True)).all()
+    if not owned_cycle:
+        seed_reference_data(db)
+        owned_cycle = db.query(CycleBlueprint).filter(CycleBlueprint.is_owned_by_default.is_(True)).all()
     for blueprint in owned_cycle:
         existing = db.query(UserCycleOwnership).filter(
             UserCycleOwnership.user_id == user.id,
@@ -134,7 +93,10 @@ def ensure_user_defaults(db: Session, user: User):
         for node in blueprint.focus_nodes:
             grant_asset_if_missing(db, user.id, "photo", node.photo_id, "default_cycle")
             grant_asset_if_missing(db, user.id, "quote", node.quote_id, "default_cycle")
+    granted = bool(db.new)
     db.commit()
+    if granted:
+        invalidate_user(user.id, "ownership")
 
 
 def grant_asset_if_missing(db: Session, user_id: int, asset_type: str, asset_id: int, source: str):
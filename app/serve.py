@@ -0,0 +1,216 @@
+import argparse
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import time
+
+
+DEFAULT_MAX_WORKERS = 4
+RESPAWN_DELAY_SECONDS = 1.0
+SUPERVISOR_POLL_SECONDS = 0.2
+
+logger = logging.getLogger("app.serve")
+
+
+def default_workers() -> int:
+    # SQLite has a single writer, so workers beyond a handful only add lock contention.
+    return int(os.getenv("SERVE_WORKERS", "0")) or min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1)
+
+
+def http_implementation() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def loop_implementation() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def preload_app():
+    from sqlalchemy import text
+
+    from app.database import engine
+    from app.database import get_db
+    from app.main import app
+    from app.main import initialize_app_state
+    from app.photo_search import photo_provider
+    from app.recommend import quote_index
+
+    initialize_app_state()
+    if engine.dialect.name == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        with engine.connect() as connection:
+            connection.execute(text("PRAGMA journal_mode=WAL"))
+    db = next(get_db())
+    try:
+        quote_index.refresh(db)
+    finally:
+        db.close()
+    photo_provider.load()
+    app.state.preloaded = True
+    return app
+
+
+def build_server(app, options: dict):
+    import uvicorn
+
+    config = uvicorn.Config(
+        app,
+        loop=loop_implementation(),
+        http=http_implementation(),
+        lifespan="on",
+        proxy_headers=True,
+        timeout_keep_alive=options["keep_alive"],
+        timeout_graceful_shutdown=options["graceful_timeout"],
+        limit_max_requests=options["max_requests"] or None,
+        access_log=options["access_log"],
+    )
+    return uvicorn.Server(config)
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int, options: dict):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.options = options
+        self.children = {}
+        self.generation = 0
+        self.stopping = False
+        self.reloading = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                build_server(self.app, self.options).run(sockets=[self.sock])
+            except BaseException:
+                logger.exception("worker %s crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self.children[pid] = self.generation
+        logger.info("started worker %s (generation %s)", pid, self.generation)
+
+    def signal_workers(self, signum: int, generation: int = None):
+        for pid, child_generation in list(self.children.items()):
+            if generation is None or child_generation == generation:
+                try:
+                    os.kill(pid, signum)
+                except ProcessLookupError:
+                    self.children.pop(pid, None)
+
+    def reap(self) -> list:
+        exited = []
+        while self.children:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            exited.append((pid, self.children.pop(pid, None)))
+        return exited
+
+    def reload(self):
+        previous = self.generation
+        self.generation += 1
+        logger.info("reloading: starting generation %s", self.generation)
+        for _ in range(self.workers):
+            self.spawn()
+        self.signal_workers(signal.SIGTERM, previous)
+
+    def stop(self):
+        self.signal_workers(signal.SIGTERM)
+        deadline = time.monotonic() + self.options["graceful_timeout"]
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(SUPERVISOR_POLL_SECONDS)
+        self.signal_workers(signal.SIGKILL)
+        while self.children:
+            self.reap()
+            time.sleep(SUPERVISOR_POLL_SECONDS / 10)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_reload)
+        for _ in range(self.workers):
+            self.spawn()
+        while not self.stopping:
+            if self.reloading:
+                self.reloading = False
+                self.reload()
+            for pid, generation in self.reap():
+                if generation == self.generation and not self.stopping:
+                    logger.warning("worker %s exited, restarting", pid)
+                    time.sleep(RESPAWN_DELAY_SECONDS)
+                    self.spawn()
+            time.sleep(SUPERVISOR_POLL_SECONDS)
+        logger.info("shutting down %s workers", len(self.children))
+        self.stop()
+
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+
+    def _request_reload(self, signum, frame):
+        self.reloading = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Pure Focus with a preloaded app and forked workers.")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--backlog", type=int)
+    parser.add_argument("--keep-alive", type=int)
+    parser.add_argument("--graceful-timeout", type=int)
+    parser.add_argument("--max-requests", type=int)
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+    workers = args.workers or default_workers()
+    if workers > 1:
+        # Must happen before app modules read their configuration.
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+
+    from app import config
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    options = {
+        "keep_alive": args.keep_alive or config.SERVE_KEEP_ALIVE_SECONDS,
+        "graceful_timeout": args.graceful_timeout or config.SERVE_GRACEFUL_TIMEOUT_SECONDS,
+        "max_requests": args.max_requests or config.SERVE_MAX_REQUESTS,
+        "access_log": args.access_log,
+    }
+    os.makedirs(config.DATA_DIR, exist_ok=True)
+    app = preload_app()
+    sock = bind_socket(args.host or config.SERVE_HOST, args.port or config.SERVE_PORT, args.backlog or config.SERVE_BACKLOG)
+    host, port = sock.getsockname()[:2]
+    logger.info(
+        "listening on %s:%s with %s workers (%s, %s, cache=%s)",
+        host, port, workers, loop_implementation(), http_implementation(), config.CACHE_BACKEND,
+    )
+    if workers > 1 and config.RATE_LIMIT_ENABLED:
+        logger.info("rate limit budgets and shed limits apply per worker (%s workers)", workers)
+    if not hasattr(os, "fork"):
+        build_server(app, options).run(sockets=[sock])
+        return
+    Supervisor(app, sock, workers, options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+
+READY_TIMEOUT_SECONDS = 120
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def start_server(workers: int, port: int, root: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": "sqlite:///{}".format(os.path.join(root, "bench.db")),
+        "ARCHIVE_DATABASE_URL": "sqlite:///{}".format(os.path.join(root, "archive.db")),
+        "CACHE_PATH": os.path.join(root, "cache.db"),
+        "UPLOAD_DIR": os.path.join(root, "uploads"),
+        "RATE_LIMIT_ENABLED": "0",
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--workers", str(workers), "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited with code {}".format(process.returncode))
+        try:
+            if httpx.get(base_url + "/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def focus_reward_client(base_url: str, index: int, deadline: float, results: dict, lock: threading.Lock):
+    latencies = []
+    errors = 0
+    cycles = 0
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+
+        def call(method: str, path: str, **kwargs):
+            nonlocal errors
+            started = time.perf_counter()
+            response = client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+            return response
+
+        call("POST", "/auth/google/callback", json={
+            "email": "bench{}@purefocus.local".format(index),
+            "provider_user_id": "bench-{}".format(index),
+        })
+        while time.monotonic() < deadline:
+            owned = [item for item in call("GET", "/cycles").json()["items"] if item["owned"]][0]
+            run = call("POST", "/runs", json={"cycle_blueprint_id": owned["id"], "cycle_mode": "owned"})
+            if run.status_code != 200:
+                continue
+            run_id = run.json()["runId"]
+            for node in owned["focusNodes"]:
+                call("POST", "/runs/{}/focus-complete".format(run_id), json={
+                    "focus_order": node["nodeOrder"],
+                    "checked_todos": ["ship mvp", "write report"],
+                    "remaining_nottodos": ["social feed"],
+                })
+            call("POST", "/runs/{}/complete".format(run_id))
+            call("POST", "/rewards/{}/claim-cycle".format(run_id))
+            call("GET", "/dashboard/summary")
+            cycles += 1
+    with lock:
+        results["latencies"].extend(latencies)
+        results["errors"] += errors
+        results["cycles"] += cycles
+
+
+def run_workload(base_url: str, clients: int, seconds: float) -> dict:
+    results = {"latencies": [], "errors": 0, "cycles": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=focus_reward_client, args=(base_url, index, deadline, results, lock))
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies = results["latencies"]
+    return {
+        "requests": len(latencies),
+        "errors": results["errors"],
+        "cycles": results["cycles"],
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare serve throughput across worker counts.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    print("{:>7} {:>9} {:>7} {:>7} {:>9} {:>9}".format("workers", "req/s", "cycles", "errors", "p50 ms", "p95 ms"))
+    for workers in args.workers:
+        root = tempfile.mkdtemp(prefix="pure_focus_bench_")
+        process = start_server(workers, args.port, root)
+        try:
+            base_url = "http://127.0.0.1:{}".format(args.port)
+            wait_until_ready(base_url, process)
+            stats = run_workload(base_url, args.clients, args.seconds)
+        finally:
+            stop_server(process)
+            shutil.rmtree(root, ignore_errors=True)
+        print("{:>7} {:>9.1f} {cycles:>7} {errors:>7} {p50:>9.1f} {p95:>9.1f}".format(workers, stats["rps"], **stats))
+
+
+if __name__ == "__main__":
+    main()
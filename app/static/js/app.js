@@ -4,6 +4,7 @@ const state = {
   quotes: [],
   cycles: [],
   summary: null,
+  calendar: null,
   collection: [],
   builderNodes: [],
   selectedCycle: null,
@@ -14,6 +15,7 @@ const state = {
   clickBurst: [],
   audioContext: null,
   activeView: "dashboard",
+  prefetchedPhotos: new Set(),
 };
 
 const elements = {};
@@ -87,10 +89,26 @@ async function bootstrap() {
     return;
   }
   state.me = await meResponse.json();
+  await syncTimezone();
   await refreshData();
   renderLoggedIn();
 }
 
+async function syncTimezone() {
+  const timezone = browserTimezone();
+  if (state.me.timezone === timezone) {
+    return;
+  }
+  const response = await fetch("/me/timezone", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ timezone }),
+  });
+  if (response.ok) {
+    state.me.timezone = timezone;
+  }
+}
+
 async function loginDemo() {
   await fetch("/auth/demo-login", { method: "POST" });
   await bootstrap();
@@ -103,17 +121,19 @@ async function logout() {
 }
 
 async function refreshData() {
-  const [photos, quotes, cycles, summary, collection] = await Promise.all([
+  const [photos, quotes, cycles, summary, calendar, collection] = await Promise.all([
     fetchJSON("/assets/photos"),
     fetchJSON("/assets/quotes"),
     fetchJSON("/cycles"),
     fetchJSON("/dashboard/summary"),
+    fetchJSON("/dashboard/calendar"),
     fetchJSON("/collection"),
   ]);
   state.photos = photos.items;
   state.quotes = quotes.items;
   state.cycles = cycles.items;
   state.summary = summary;
+  state.calendar = calendar;
   state.collection = collection.items;
   ensureBuilderNodes();
 }
@@ -171,17 +191,16 @@ function renderSummary() {
   elements.todoCount.textContent = summary.todoCount;
   elements.nottodoCount.textContent = summary.nottodoCount;
 
-  const calendarEntries = [...summary.focusCalendar].sort((left, right) => String(left.date).localeCompare(String(right.date)));
-  if (!calendarEntries.length) {
+  if (!state.calendar || !state.calendar.total) {
     elements.calendarGrid.innerHTML = '<p class="calendar-empty">No focus history yet. Complete a run to start filling the dashboard.</p>';
     return;
   }
-  elements.calendarGrid.innerHTML = calendarEntries.map((entry) => `
-    <article class="calendar-cell">
-      <strong>${entry.count}</strong>
-      <div>${entry.date}</div>
-    </article>
-  `).join("");
+  const leadingBlanks = new Date(`${state.calendar.start}T00:00:00`).getDay();
+  const blanks = Array.from({ length: leadingBlanks }, () => '<span class="calendar-day calendar-day-blank"></span>');
+  const days = state.calendar.days.map((entry) => `
+    <span class="calendar-day" data-level="${entry.level}" title="${entry.date} · ${entry.count} focus"></span>
+  `);
+  elements.calendarGrid.innerHTML = `<div class="calendar-heatmap">${blanks.concat(days).join("")}</div>`;
 }
 
 function renderCycles() {
@@ -431,7 +450,9 @@ async function startPreparedRun() {
     index: 0,
     remainingSeconds: state.selectedCycle.focusNodes[0].focusDurationSeconds,
     totalSeconds: state.selectedCycle.focusNodes[0].focusDurationSeconds,
+    suggestedQuotes: [],
   };
+  loadSuggestedQuotes(state.run);
   resetClickBurst();
   elements.modalBackdrop.classList.add("hidden");
   startInterval();
@@ -440,6 +461,20 @@ async function startPreparedRun() {
   elements.timerPanel.scrollIntoView({ behavior: "smooth", block: "start" });
 }
 
+async function loadSuggestedQuotes(run) {
+  const texts = run.focusStates.flatMap((focus) => focus.todos.concat(focus.nottodos).map((item) => item.content));
+  const response = await fetch("/quotes/recommend", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ texts, limit: run.focusStates.length }),
+  });
+  if (!response.ok || state.run !== run) {
+    return;
+  }
+  run.suggestedQuotes = (await response.json()).items;
+  renderTasks();
+}
+
 function linesToTasks(text, taskType) {
   return text.split("\n").map((line) => line.trim()).filter(Boolean).map((line) => ({
     content: line,
@@ -535,18 +570,39 @@ function renderRun() {
   elements.timerQuote.textContent = currentNode.quote.text;
   elements.timerAuthor.textContent = currentNode.quote.authorName ? `Quote by ${currentNode.quote.authorName}` : "";
   elements.timerSource.textContent = currentNode.photo.sourceLabel || "";
-  elements.timerHero.style.backgroundImage = `linear-gradient(180deg, rgba(7, 7, 7, 0.22), rgba(7, 7, 7, 0.76)), linear-gradient(120deg, rgba(16, 16, 16, 0.28), rgba(16, 16, 16, 0.48)), url('${currentNode.photo.url}')`;
+  elements.timerHero.style.backgroundColor = currentNode.photo.dominantColor || "";
+  elements.timerHero.style.backgroundImage = [
+    "linear-gradient(180deg, rgba(7, 7, 7, 0.22), rgba(7, 7, 7, 0.76))",
+    "linear-gradient(120deg, rgba(16, 16, 16, 0.28), rgba(16, 16, 16, 0.48))",
+    `url('${currentNode.photo.url}')`,
+    currentNode.photo.placeholder ? `url('${currentNode.photo.placeholder}')` : null,
+  ].filter(Boolean).join(", ");
   elements.timerProgress.style.width = `${Math.max(progress, 0)}%`;
   elements.timerOrb.style.setProperty("--timer-progress-deg", `${Math.max(progress, 0) * 3.6}deg`);
+  const nextNode = state.run.cycle.focusNodes[state.run.index + 1];
+  if (nextNode) {
+    prefetchPhoto(nextNode.photo.url);
+  }
   renderTasks();
 }
 
+function prefetchPhoto(url) {
+  if (state.prefetchedPhotos.has(url)) {
+    return;
+  }
+  state.prefetchedPhotos.add(url);
+  const image = new Image();
+  image.decoding = "async";
+  image.src = url;
+}
+
 function renderTimerIdle() {
   elements.timerMode.textContent = "Idle";
   elements.timerClock.textContent = "00:00";
   elements.timerQuote.textContent = "Choose a cycle in Setting and prepare a run.";
   elements.timerAuthor.textContent = "";
   elements.timerSource.textContent = "";
+  elements.timerHero.style.backgroundColor = "";
   elements.timerHero.style.backgroundImage = "linear-gradient(180deg, rgba(7, 7, 7, 0.24), rgba(7, 7, 7, 0.74)), linear-gradient(120deg, rgba(18, 18, 18, 0.4), rgba(18, 18, 18, 0.8))";
   elements.timerProgress.style.width = "0%";
   elements.timerOrb.style.setProperty("--timer-progress-deg", "0deg");
@@ -563,7 +619,15 @@ function renderTasks() {
     return;
   }
   const focusState = state.run.focusStates[state.run.index];
+  const suggestion = state.run.suggestedQuotes[state.run.index % Math.max(state.run.suggestedQuotes.length, 1)];
   elements.taskPanel.innerHTML = `
+    ${suggestion ? `
+      <div class="task-list task-suggestion">
+        <h3>Words for this focus</h3>
+        <p>${escapeHTML(suggestion.text)}</p>
+        <span class="node-meta">${escapeHTML(suggestion.authorName)}</span>
+      </div>
+    ` : ""}
     <div class="task-list">
       <h3>Todo</h3>
       ${focusState.todos.length ? focusState.todos.map((item, index) => `
@@ -612,6 +676,11 @@ function openRewardModal(actions) {
       <input id="upload-file" type="file" accept="image/*">
       <button type="submit">Use Photo Reward</button>
     </form>
+    <form id="photo-search-form" class="reward-form hidden">
+      <input id="photo-search-query" type="text" placeholder="Or search photos">
+      <button class="ghost" type="submit">Search</button>
+      <div id="photo-search-results" class="photo-search-results"></div>
+    </form>
     <form id="quote-form" class="reward-form hidden">
       <input id="quote-text" type="text" placeholder="Quote text">
       <input id="quote-author" type="text" placeholder="Author">
@@ -621,14 +690,24 @@ function openRewardModal(actions) {
   const claimButton = document.getElementById("claim-cycle-btn");
   if (claimButton) {
     claimButton.addEventListener("click", async () => {
-      await fetchJSON(`/rewards/${state.run.id}/claim-cycle`, { method: "POST" });
-      finishRewardFlow();
+      const result = await fetchJSON(`/rewards/${state.run.id}/claim-cycle`, { method: "POST" });
+      finishRewardFlow(result.jobs);
     });
   }
   const uploadButton = document.getElementById("show-upload-btn");
   if (uploadButton) {
     uploadButton.addEventListener("click", () => {
       document.getElementById("upload-form").classList.toggle("hidden");
+      document.getElementById("photo-search-form").classList.toggle("hidden");
+    });
+    document.getElementById("photo-search-form").addEventListener("submit", async (event) => {
+      event.preventDefault();
+      const query = document.getElementById("photo-search-query").value.trim();
+      if (!query) {
+        return;
+      }
+      const data = await fetchJSON(`/photos/search?query=${encodeURIComponent(query)}&per_page=12`);
+      renderPhotoSearchResults(data.results);
     });
     document.getElementById("upload-form").addEventListener("submit", async (event) => {
       event.preventDefault();
@@ -638,8 +717,8 @@ function openRewardModal(actions) {
       }
       const formData = new FormData();
       formData.append("file", fileInput.files[0]);
-      await fetchJSON(`/rewards/${state.run.id}/upload-photo`, { method: "POST", body: formData });
-      finishRewardFlow();
+      const result = await fetchJSON(`/rewards/${state.run.id}/upload-photo`, { method: "POST", body: formData });
+      finishRewardFlow(result.jobs);
     });
   }
   const quoteButton = document.getElementById("show-quote-btn");
@@ -659,9 +738,38 @@ function openRewardModal(actions) {
   }
 }
 
-async function finishRewardFlow() {
+function renderPhotoSearchResults(results) {
+  const container = document.getElementById("photo-search-results");
+  if (!results.length) {
+    container.innerHTML = '<p class="photo-search-empty">No photos found.</p>';
+    return;
+  }
+  container.innerHTML = results
+    .map(
+      (photo) => `
+        <button class="photo-search-result" type="button" data-photo-id="${escapeHTML(photo.id)}" style="background-color: ${escapeHTML(photo.color || "#d8d2c4")}">
+          <img src="${escapeHTML(photo.urls.thumb || photo.urls.small || photo.urls.regular)}" alt="${escapeHTML(photo.description || "")}" loading="lazy">
+          <span>${escapeHTML(photo.user.name || "")}</span>
+        </button>
+      `
+    )
+    .join("");
+  container.querySelectorAll("[data-photo-id]").forEach((button) => {
+    button.addEventListener("click", async () => {
+      await fetchJSON(`/rewards/${state.run.id}/select-photo`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ photo_id: button.dataset.photoId }),
+      });
+      finishRewardFlow();
+    });
+  });
+}
+
+async function finishRewardFlow(jobs = []) {
   elements.modalBackdrop.classList.add("hidden");
   stopLocalRun(false);
+  await waitForJobs(jobs);
   await refreshData();
   renderSummary();
   renderCycles();
@@ -670,6 +778,15 @@ async function finishRewardFlow() {
   setActiveView("dashboard");
 }
 
+async function waitForJobs(jobs) {
+  let pending = jobs.filter((job) => job.status === "queued" || job.status === "running");
+  for (let attempt = 0; pending.length && attempt < 20; attempt += 1) {
+    await new Promise((resolve) => window.setTimeout(resolve, 250 * Math.min(attempt + 1, 4)));
+    const updates = await Promise.all(pending.map((job) => fetch(`/jobs/${job.id}`).then((response) => response.json())));
+    pending = updates.filter((job) => job.status === "queued" || job.status === "running");
+  }
+}
+
 async function stopRunOnServer() {
   if (!state.run) {
     return;
@@ -768,20 +885,36 @@ function renderCollection() {
           <p class="node-meta">${new Date(item.collectedAt).toLocaleString()}</p>
         </div>
       </div>
-      <div class="focus-strip">
-        ${item.focusNodes.map((node) => `
-          <div class="focus-mini">
-            <img src="${node.photo.url}" alt="">
-            <p>${escapeHTML(shorten(node.quote.text, 48))}</p>
-          </div>
-        `).join("")}
-      </div>
+      ${item.mosaicUrl ? `
+        <img class="collection-mosaic" src="${item.mosaicUrl}" alt="" loading="lazy" decoding="async">
+        <div class="focus-strip">
+          ${item.focusNodes.map((node) => `
+            <div class="focus-mini">
+              <p>${escapeHTML(shorten(node.quote.text, 48))}</p>
+            </div>
+          `).join("")}
+        </div>
+      ` : `
+        <div class="focus-strip">
+          ${item.focusNodes.map((node) => `
+            <div class="focus-mini">
+              <img src="${node.photo.thumbnailUrl || node.photo.url}" alt="" loading="lazy" decoding="async" style="background: ${node.photo.dominantColor || "transparent"} ${node.photo.placeholder ? `url('${node.photo.placeholder}') center / cover` : ""}">
+              <p>${escapeHTML(shorten(node.quote.text, 48))}</p>
+            </div>
+          `).join("")}
+        </div>
+      `}
     </article>
   `).join("");
 }
 
-async function fetchJSON(url, options = {}) {
+async function fetchJSON(url, options = {}, retries = 2) {
   const response = await fetch(url, options);
+  const retryAfter = Number(response.headers.get("Retry-After"));
+  if ((response.status === 429 || response.status === 503) && retries > 0 && retryAfter > 0 && retryAfter <= 5) {
+    await new Promise((resolve) => window.setTimeout(resolve, retryAfter * 1000));
+    return fetchJSON(url, options, retries - 1);
+  }
   if (!response.ok) {
     const payload = await response.json().catch(() => ({ detail: "Request failed" }));
     window.alert(payload.detail || "Request failed");
@@ -790,6 +923,10 @@ async function fetchJSON(url, options = {}) {
   return response.json();
 }
 
+function browserTimezone() {
+  return Intl.DateTimeFormat().resolvedOptions().timeZone || "UTC";
+}
+
 function formatSeconds(value) {
   const minutes = Math.floor(value / 60);
   const seconds = value % 60;
@@ -0,0 +1,136 @@
+import argparse
+from datetime import datetime
+
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy import text
+
+from app.analytics import open_archive_session
+from app.config import ARCHIVE_DATABASE_URL
+from app.database import engine
+from app.database import prepare_schema
+from app.database import rebuild_autoincrement_tables
+from app.models import FocusTaskRecord
+from app.models import TaskVocabulary
+
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+def lookup_task_ids(executor, user_id: int, contents: list) -> dict:
+    table = TaskVocabulary.__table__
+    ids = {}
+    for start in range(0, len(contents), LOOKUP_CHUNK_SIZE):
+        ids.update(executor.execute(
+            select(table.c.content, table.c.id).where(
+                table.c.user_id == user_id,
+                table.c.content.in_(contents[start:start + LOOKUP_CHUNK_SIZE]),
+            )
+        ).all())
+    return ids
+
+
+def ensure_task_ids(executor, pairs) -> dict:
+    by_user = {}
+    for user_id, content in pairs:
+        by_user.setdefault(user_id, {})[content] = None
+    ids = {}
+    now = datetime.utcnow()
+    for user_id, contents in by_user.items():
+        contents = list(contents)
+        known = lookup_task_ids(executor, user_id, contents)
+        missing = [content for content in contents if content not in known]
+        if missing:
+            executor.execute(
+                TaskVocabulary.__table__.insert().prefix_with("OR IGNORE", dialect="sqlite"),
+                [{"user_id": user_id, "content": content, "created_at": now} for content in missing],
+            )
+            known.update(lookup_task_ids(executor, user_id, missing))
+        for content, task_id in known.items():
+            ids[(user_id, content)] = task_id
+    return ids
+
+
+def add_task_records(db, record_id: int, user_id: int, items_by_type: dict):
+    task_ids = ensure_task_ids(db, [(user_id, item) for items in items_by_type.values() for item in items])
+    rows = [
+        {"focus_completion_record_id": record_id, "task_type": task_type, "task_id": task_ids[(user_id, item)]}
+        for task_type, items in items_by_type.items()
+        for item in items
+    ]
+    if rows:
+        db.execute(FocusTaskRecord.__table__.insert(), rows)
+
+
+class TaskCompactionError(RuntimeError):
+    pass
+
+
+def needs_task_compaction(bind) -> bool:
+    inspector = inspect(bind)
+    if not inspector.has_table("focus_task_records"):
+        return False
+    return "content" in [column["name"] for column in inspector.get_columns("focus_task_records")]
+
+
+def require_compacted_task_records(bind):
+    if needs_task_compaction(bind):
+        raise TaskCompactionError(
+            "focus_task_records still has its legacy content column; run `python -m app.task_vocabulary` first"
+        )
+
+
+def compact_task_records(bind) -> bool:
+    if bind.dialect.name != "sqlite" or not needs_task_compaction(bind):
+        return False
+    with bind.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT OR IGNORE INTO task_vocabulary (user_id, content, created_at) "
+                "SELECT DISTINCT r.user_id, t.content, :now FROM focus_task_records t "
+                "JOIN focus_completion_records f ON f.id = t.focus_completion_record_id "
+                "JOIN cycle_runs r ON r.id = f.run_id"
+            ),
+            {"now": datetime.utcnow()},
+        )
+        connection.execute(
+            text(
+                "UPDATE focus_task_records SET task_id = ("
+                "SELECT v.id FROM focus_completion_records f "
+                "JOIN cycle_runs r ON r.id = f.run_id "
+                "JOIN task_vocabulary v ON v.user_id = r.user_id "
+                "WHERE f.id = focus_task_records.focus_completion_record_id "
+                "AND v.content = focus_task_records.content"
+                ") WHERE task_id IS NULL"
+            )
+        )
+    with bind.connect() as connection:
+        unmapped = connection.execute(text("SELECT COUNT(*) FROM focus_task_records WHERE task_id IS NULL")).scalar()
+    if unmapped:
+        raise TaskCompactionError(
+            "{} task records could not be mapped to the vocabulary; keeping the content column".format(unmapped)
+        )
+    with bind.begin() as connection:
+        connection.execute(text("ALTER TABLE focus_task_records DROP COLUMN content"))
+    rebuild_autoincrement_tables(bind)
+    with bind.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move legacy task text into the per-user task vocabulary.")
+    parser.add_argument("--archive-url", default=ARCHIVE_DATABASE_URL)
+    args = parser.parse_args()
+    prepare_schema(engine)
+    binds = [("primary", engine)]
+    archive_db = open_archive_session(args.archive_url)
+    if archive_db is not None:
+        binds.append(("archive", archive_db.get_bind()))
+        archive_db.close()
+    for label, bind in binds:
+        print("{}: {}".format(label, "compacted" if compact_task_records(bind) else "nothing to compact"))
+
+
+if __name__ == "__main__":
+    main()
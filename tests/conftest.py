@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import pytest
+from PIL import Image
+
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "main")
+TEST_ROOT = tempfile.mkdtemp(prefix="pure_focus_{}_".format(WORKER_ID))
+SAMPLE_PHOTOS = [
+    "city-night-k1-unsplash.jpg",
+    "desert-dune-q2-unsplash.jpg",
+    "forest-path-x9-unsplash.jpg",
+    "misty-hill-unsplash.jpg",
+    "mountain-lake-abc123-unsplash.jpg",
+    "ocean-wave-unsplash.jpg",
+    "river-bend-z7-unsplash.jpg",
+    "snow-peak-unsplash.jpg",
+    "sunset-field-unsplash.jpg",
+]
+SAMPLE_QUOTES = 12
+
+
+def write_sample_fixtures(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    for index, filename in enumerate(SAMPLE_PHOTOS):
+        Image.new("RGB", (60 + index, 48), (20 * index, 100, 180 - 15 * index)).save(os.path.join(directory, filename))
+    quotes = [
+        {"quote": "Quote number {}".format(index), "speaker": "Speaker {}".format(index), "category": "focus"}
+        for index in range(SAMPLE_QUOTES)
+    ]
+    with open(os.path.join(directory, "quote.json"), "w", encoding="utf-8") as handle:
+        json.dump({"quotes": quotes}, handle)
+
+
+write_sample_fixtures(os.path.join(TEST_ROOT, "sample"))
+os.environ["SAMPLE_DIR"] = os.path.join(TEST_ROOT, "sample")
+os.environ["DATABASE_URL"] = "sqlite://"
+os.environ["UPLOAD_DIR"] = os.path.join(TEST_ROOT, "uploads")
+os.environ["ARCHIVE_DATABASE_URL"] = "sqlite:///{}".format(os.path.join(TEST_ROOT, "archive.db"))
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["JOB_MODE"] = "inline"
+os.environ["ADMIN_EMAILS"] = "demo@purefocus.local"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.cache import cache  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.database import engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.main import initialize_app_state  # noqa: E402
+from app.ratelimit import rate_limiter  # noqa: E402
+from app.recommend import quote_index  # noqa: E402
+
+
+def sqlite_connection():
+    return engine.raw_connection().connection
+
+
+@pytest.fixture(scope="session")
+def seeded_template():
+    initialize_app_state()
+    template = sqlite3.connect(":memory:", check_same_thread=False)
+    sqlite_connection().backup(template)
+    yield template
+    template.close()
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def isolated_database(seeded_template):
+    # Every test starts from the seeded snapshot: the app commits on several
+    # sessions (requests, inline jobs), so restoring the in-memory database is
+    # what keeps one test's writes out of the next.
+    seeded_template.backup(sqlite_connection())
+    cache.clear()
+    quote_index.clear()
+    rate_limiter.reset()
+    yield
+    cache.clear()
+    quote_index.clear()
+
+
+@pytest.fixture
+def db(isolated_database):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(isolated_database):
+    return TestClient(app)
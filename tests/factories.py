@@ -0,0 +1,131 @@
+import json
+import random
+from datetime import datetime
+from datetime import timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.analytics import rebuild_analytics
+from app.focus_calendar import rebuild_daily_counts
+from app.models import CycleBlueprint
+from app.models import CycleRun
+from app.models import FocusCompletionRecord
+from app.models import FocusTaskRecord
+from app.models import RewardEntitlement
+from app.models import TaskVocabulary
+from app.models import User
+
+
+TASK_WORDS = (
+    "ship mvp", "write report", "review pull request", "plan sprint", "read paper", "fix login bug",
+    "answer email", "social feed", "news sites", "phone games", "meetings", "refactor tests",
+)
+REWARD_ACTIONS = json.dumps(["claim_cycle", "upload_photo", "add_quote"])
+
+
+def next_id(db: Session, model) -> int:
+    return (db.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def seed_focus_history(
+    db: Session,
+    users: int = 1000,
+    runs_per_user: int = 3,
+    tasks_per_focus: int = 2,
+    days: int = 60,
+    seed: int = 7,
+    now: datetime = None,
+) -> dict:
+    rng = random.Random(seed)
+    now = now or datetime.utcnow()
+    blueprint = db.query(CycleBlueprint).filter(CycleBlueprint.is_owned_by_default.is_(True)).order_by(
+        CycleBlueprint.id
+    ).first()
+    nodes = [(node.node_order, node.photo_id, node.quote_id, node.focus_duration_seconds) for node in blueprint.focus_nodes]
+    user_id = next_id(db, User)
+    run_id = next_id(db, CycleRun)
+    record_id = next_id(db, FocusCompletionRecord)
+    vocabulary_id = next_id(db, TaskVocabulary)
+    user_rows, run_rows, record_rows, task_rows, entitlement_rows, vocabulary_rows = [], [], [], [], [], []
+    for _ in range(users):
+        task_ids = {}
+        user_rows.append({
+            "id": user_id,
+            "email": "focuser{}@factory.local".format(user_id),
+            "nickname": "Focuser {}".format(user_id),
+            "timezone": "UTC",
+            "created_at": now,
+            "last_login_at": now,
+        })
+        for _ in range(runs_per_user):
+            started_at = now - timedelta(days=rng.randrange(days), minutes=rng.randrange(24 * 60))
+            recorded_at = started_at
+            for node_order, photo_id, quote_id, duration in nodes:
+                recorded_at += timedelta(seconds=duration)
+                record_rows.append({
+                    "id": record_id,
+                    "run_id": run_id,
+                    "focus_order": node_order,
+                    "photo_id": photo_id,
+                    "quote_id": quote_id,
+                    "focus_duration_seconds": duration,
+                    "recorded_at": recorded_at,
+                    "local_date": recorded_at.date().isoformat(),
+                })
+                for index in range(tasks_per_focus):
+                    word = rng.choice(TASK_WORDS)
+                    if word not in task_ids:
+                        task_ids[word] = vocabulary_id
+                        vocabulary_rows.append({
+                            "id": vocabulary_id,
+                            "user_id": user_id,
+                            "content": word,
+                            "created_at": now,
+                        })
+                        vocabulary_id += 1
+                    task_rows.append({
+                        "focus_completion_record_id": record_id,
+                        "task_type": "todo" if index % 2 == 0 else "nottodo",
+                        "task_id": task_ids[word],
+                    })
+                record_id += 1
+            run_rows.append({
+                "id": run_id,
+                "user_id": user_id,
+                "cycle_blueprint_id": blueprint.id,
+                "cycle_mode": "owned",
+                "status": "completed",
+                "completed_focus_count": len(nodes),
+                "created_at": started_at,
+                "updated_at": recorded_at,
+            })
+            entitlement_rows.append({
+                "run_id": run_id,
+                "user_id": user_id,
+                "status": "used",
+                "allowed_actions_json": REWARD_ACTIONS,
+                "created_at": recorded_at,
+                "used_at": recorded_at,
+            })
+            run_id += 1
+        user_id += 1
+    for model, rows in (
+        (User, user_rows),
+        (TaskVocabulary, vocabulary_rows),
+        (CycleRun, run_rows),
+        (FocusCompletionRecord, record_rows),
+        (FocusTaskRecord, task_rows),
+        (RewardEntitlement, entitlement_rows),
+    ):
+        if rows:
+            db.execute(model.__table__.insert(), rows)
+    db.commit()
+    rebuild_daily_counts(db)
+    rebuild_analytics(db)
+    return {
+        "userIds": [row["id"] for row in user_rows],
+        "runs": len(run_rows),
+        "records": len(record_rows),
+        "tasks": len(task_rows),
+    }
@@ -1,22 +1,19 @@
-import os
+import io
+from datetime import datetime
+from datetime import timedelta
 
-from fastapi.testclient import TestClient
+import pytest
 
-os.environ["DATABASE_URL"] = "sqlite:///./test_pure_focus.db"
+from app.config import PROFILING_ENABLED
 
-from app.main import app  # noqa: E402
 
-
-client = TestClient(app)
-
-
-def login():
+def login(client):
     response = client.post("/auth/demo-login")
     assert response.status_code == 200
 
 
-def test_demo_login_and_seeded_cycles():
-    login()
+def test_demo_login_and_seeded_cycles(client):
+    login(client)
     me_response = client.get("/me")
     assert me_response.status_code == 200
     cycles_response = client.get("/cycles")
@@ -29,8 +26,8 @@ def test_demo_login_and_seeded_cycles():
     assert first_photo_label
 
 
-def test_focus_completion_and_reward_flow():
-    login()
+def test_focus_completion_and_reward_flow(client):
+    login(client)
     cycles = client.get("/cycles").json()["items"]
     owned_cycle = [item for item in cycles if item["owned"]][0]
     run_response = client.post("/runs", json={
@@ -60,7 +57,7 @@ def test_focus_completion_and_reward_flow():
     assert collection_response.json()["items"]
 
 
-def test_index_contains_three_tab_shell():
+def test_index_contains_three_tab_shell(client):
     response = client.get("/")
     assert response.status_code == 200
     html = response.text
@@ -71,3 +68,809 @@ def test_index_contains_three_tab_shell():
     assert 'data-view-target="collection"' not in html
     assert "material-symbols-outlined" not in html
     assert "Triple-click anywhere outside the modal to stop and reset the current run." not in html
+
+
+def complete_owned_cycle(client, todos=None, nottodos=None):
+    cycles = client.get("/cycles").json()["items"]
+    owned_cycle = [item for item in cycles if item["owned"]][0]
+    run_id = client.post("/runs", json={
+        "cycle_blueprint_id": owned_cycle["id"],
+        "cycle_mode": "owned",
+    }).json()["runId"]
+    for node in owned_cycle["focusNodes"]:
+        response = client.post(
+            f"/runs/{run_id}/focus-complete",
+            json={
+                "focus_order": node["nodeOrder"],
+                "checked_todos": todos if todos is not None else ["ship mvp"],
+                "remaining_nottodos": nottodos if nottodos is not None else ["social feed"],
+            },
+        )
+        assert response.status_code == 200
+    assert client.post(f"/runs/{run_id}/complete").status_code == 200
+    assert client.post(f"/rewards/{run_id}/claim-cycle").status_code == 200
+    return run_id
+
+
+def test_archive_moves_old_runs_and_keeps_dashboard_totals(client, db, tmp_path):
+    from sqlalchemy.orm import Session
+
+    from app.analytics import verify_analytics
+    from app.archive import archive_old_runs
+    from app.archive import create_archive_engine
+    from app.models import CycleRun
+    from app.models import FocusCompletionRecord
+
+    login(client)
+    run_id = complete_owned_cycle(client)
+    stopped_run_id = client.post("/runs", json={
+        "cycle_blueprint_id": client.get("/cycles").json()["items"][0]["id"],
+        "cycle_mode": "owned",
+    }).json()["runId"]
+    client.post(f"/runs/{stopped_run_id}/stop")
+    before = client.get("/dashboard/summary").json()
+
+    archive_engine = create_archive_engine("sqlite:///{}".format(tmp_path / "archive.db"))
+    db.query(CycleRun).filter(CycleRun.status != "active").update(
+        {CycleRun.updated_at: datetime.utcnow() - timedelta(days=400)},
+        synchronize_session=False,
+    )
+    db.commit()
+    stats = archive_old_runs(db, archive_engine, older_than_days=180)
+    assert (stats["runsArchived"], stats["runsPruned"]) == (1, 1)
+    assert db.query(CycleRun).filter(CycleRun.id.in_([run_id, stopped_run_id])).count() == 0
+    with archive_engine.connect() as connection:
+        archived = connection.execute(
+            FocusCompletionRecord.__table__.select().where(FocusCompletionRecord.run_id == run_id)
+        ).fetchall()
+        archived_tasks = connection.execute(
+            "SELECT v.content FROM focus_task_records t JOIN task_vocabulary v ON v.id = t.task_id"
+        ).fetchall()
+    assert len(archived) == 4
+    assert sorted(set(row[0] for row in archived_tasks)) == ["ship mvp", "social feed"]
+
+    after = client.get("/dashboard/summary").json()
+    assert after == before
+    archive_db = Session(bind=archive_engine)
+    try:
+        assert verify_analytics(db, archive_db) == []
+    finally:
+        archive_db.close()
+
+
+def test_legacy_tables_stop_reusing_ids_and_archive_refuses_collisions(tmp_path):
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+    from sqlalchemy.schema import CreateTable
+
+    from app.archive import ArchiveConflictError
+    from app.archive import copy_rows
+    from app.archive import create_archive_engine
+    from app.archive import reserve_archived_ids
+    from app.database import build_engine
+    from app.database import prepare_schema
+    from app.models import CycleRun
+
+    runs = CycleRun.__table__
+    legacy = build_engine("sqlite:///{}".format(tmp_path / "legacy.db"))
+    with legacy.begin() as connection:
+        connection.execute(text(str(CreateTable(runs).compile(dialect=legacy.dialect)).replace(" AUTOINCREMENT", "")))
+    row = {"user_id": 1, "cycle_blueprint_id": 1, "cycle_mode": "owned", "status": "stopped", "completed_focus_count": 0}
+    with legacy.begin() as connection:
+        connection.execute(runs.insert(), [dict(row), dict(row)])
+    prepare_schema(legacy)
+    with legacy.begin() as connection:
+        assert "AUTOINCREMENT" in connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'cycle_runs'")).scalar()
+        connection.execute(runs.delete().where(runs.c.id == 2))
+        assert connection.execute(runs.insert(), dict(row)).inserted_primary_key[0] == 3
+        archived = dict(connection.execute(runs.select().where(runs.c.id == 1)).mappings().one())
+
+    archive_engine = create_archive_engine("sqlite:///{}".format(tmp_path / "archive.db"))
+    with archive_engine.begin() as connection:
+        copy_rows(connection, runs, [archived, dict(archived, id=10)])
+        copy_rows(connection, runs, [archived])
+    with pytest.raises(ArchiveConflictError):
+        with archive_engine.begin() as connection:
+            copy_rows(connection, runs, [dict(archived, status="completed")])
+    session = Session(bind=legacy)
+    try:
+        reserve_archived_ids(session, archive_engine)
+    finally:
+        session.close()
+    with legacy.begin() as connection:
+        assert connection.execute(runs.insert(), dict(row)).inserted_primary_key[0] == 11
+
+
+def test_focus_calendar_returns_dense_range_with_levels(client):
+    login(client)
+    complete_owned_cycle(client)
+    today = client.get("/dashboard/calendar").json()["end"]
+    response = client.get("/dashboard/calendar", params={"end": today, "timezone": "UTC"})
+    assert response.status_code == 200
+    payload = response.json()
+    assert len(payload["days"]) == 365
+    assert payload["days"][-1]["date"] == today
+    assert payload["days"][-1]["count"] >= 4
+    assert payload["days"][-1]["level"] >= 1
+    assert payload["total"] == sum(day["count"] for day in payload["days"])
+    assert len(payload["quartiles"]) == 3
+
+    assert client.get("/dashboard/calendar", params={"timezone": "Mars/Olympus"}).status_code == 400
+    too_long = client.get("/dashboard/calendar", params={"start": "2020-01-01", "end": "2022-01-01"})
+    assert too_long.status_code == 400
+    latest = client.get("/dashboard/calendar", params={"start": "9999-12-01"}).json()
+    assert (latest["end"], len(latest["days"])) == ("9999-12-31", 31)
+    earliest = client.get("/dashboard/calendar", params={"end": "0001-01-02"}).json()
+    assert (earliest["start"], len(earliest["days"])) == ("0001-01-01", 2)
+
+
+def test_focus_records_bucket_on_user_local_date(client):
+    from app.focus_calendar import local_date_for
+
+    assert local_date_for(datetime(2026, 3, 1, 20, 30), "Asia/Seoul") == "2026-03-02"
+    assert local_date_for(datetime(2026, 3, 1, 2, 30), "America/Los_Angeles") == "2026-02-28"
+    assert local_date_for(datetime(2026, 3, 1, 2, 30), "Not/AZone") == "2026-03-01"
+
+    login(client)
+    assert client.post("/me/timezone", json={"timezone": "Nowhere/Land"}).status_code == 400
+    assert client.post("/me/timezone", json={"timezone": "Pacific/Kiritimati"}).status_code == 200
+    assert client.get("/me").json()["timezone"] == "Pacific/Kiritimati"
+    complete_owned_cycle(client)
+    calendar = client.get("/dashboard/calendar").json()
+    assert calendar["timezone"] == "Pacific/Kiritimati"
+    assert calendar["days"][-1]["count"] == 4
+
+
+def test_dashboard_focus_count_does_not_wait_for_rollup_jobs(client, monkeypatch):
+    from app.jobs import job_queue
+
+    login(client)
+    monkeypatch.setattr(job_queue, "mode", "external")
+    complete_owned_cycle(client)
+    summary = client.get("/dashboard/summary").json()
+    assert summary["focusCount"] == 4 and summary["focusCalendar"] == []
+
+
+def test_memory_cache_evicts_and_invalidates():
+    from app.cache import MISSING
+    from app.cache import MemoryCache
+
+    memory = MemoryCache(max_entries=2, ttl_seconds=60)
+    memory.set("ns", "a", [1])
+    memory.set("ns", "b", [2])
+    assert memory.get("ns", "a") == [1]
+    memory.set("ns", "c", [3])
+    assert memory.get("ns", "b", MISSING) is MISSING
+    stale_generation = memory.generation("ns")
+    memory.invalidate("ns")
+    assert memory.get("ns", "a", MISSING) is MISSING
+    memory.set("ns", "a", ["stale"], generation=stale_generation)
+    assert memory.get("ns", "a", MISSING) is MISSING
+    memory.set("ns", "short", 1, ttl_seconds=-1)
+    assert memory.get("ns", "short", MISSING) is MISSING
+
+
+def test_sqlite_cache_invalidation_is_shared(tmp_path):
+    from app.cache import MISSING
+    from app.cache import SQLiteCache
+
+    path = str(tmp_path / "cache.db")
+    first = SQLiteCache(path=path)
+    second = SQLiteCache(path=path)
+    assert first.get_or_set("ownership:1", "photo", lambda: [1, 2]) == [1, 2]
+    assert second.get("ownership:1", "photo") == [1, 2]
+    second.invalidate("ownership:1")
+    assert first.get("ownership:1", "photo", MISSING) is MISSING
+
+
+def test_reward_quote_invalidates_cached_ownership(client):
+    login(client)
+    before = client.get("/assets/quotes").json()["items"]
+    cycles = client.get("/cycles").json()["items"]
+    owned_cycle = [item for item in cycles if item["owned"]][0]
+    run_id = client.post("/runs", json={
+        "cycle_blueprint_id": owned_cycle["id"],
+        "cycle_mode": "owned",
+    }).json()["runId"]
+    for node in owned_cycle["focusNodes"]:
+        client.post(
+            f"/runs/{run_id}/focus-complete",
+            json={"focus_order": node["nodeOrder"], "checked_todos": [], "remaining_nottodos": []},
+        )
+    assert client.post(f"/runs/{run_id}/complete").status_code == 200
+    response = client.post(
+        f"/rewards/{run_id}/add-quote",
+        data={"text": "Cache me if you can", "author_name": "Tester"},
+    )
+    assert response.status_code == 200
+    after = client.get("/assets/quotes").json()["items"]
+    assert len(after) == len(before) + 1
+
+
+def test_photos_carry_placeholders_and_serve_byte_ranges(client):
+    login(client)
+    photo = client.get("/assets/photos").json()["items"][0]
+    assert photo["placeholder"].startswith("data:image/jpeg;base64,")
+    assert photo["dominantColor"].startswith("#")
+
+    full = client.get(photo["url"])
+    assert full.status_code == 200
+    assert full.headers["accept-ranges"] == "bytes"
+    partial = client.get(photo["url"], headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206
+    assert partial.content == full.content[:10]
+    assert partial.headers["content-range"] == "bytes 0-9/{}".format(len(full.content))
+    suffix = client.get(photo["url"], headers={"Range": "bytes=-4"})
+    assert suffix.content == full.content[-4:]
+    beyond = client.get(photo["url"], headers={"Range": "bytes={}-".format(len(full.content))})
+    assert beyond.status_code == 416
+
+
+def test_quote_ingestion_streams_and_deduplicates(db, tmp_path):
+    import json
+
+    from app.models import Quote
+    from app.quotes import ingest_quotes
+
+    items = [{"quote": "Catalog quote {}".format(index), "speaker": "Catalog Author"} for index in range(1200)]
+    items.append({"quote": "  catalog   QUOTE 7 ", "speaker": "catalog author"})
+    items.append({"quote": "", "speaker": "Nobody"})
+    json_path = tmp_path / "catalog.json"
+    json_path.write_text(json.dumps({
+        "generated": "[not the array]",
+        "note": "the \"quotes\": [] key below is the real one",
+        "meta": {"quotes": [{"quote": "Nested decoy", "speaker": "Decoy"}], "count": 1202},
+        "quotes": items,
+    }), encoding="utf-8")
+    ndjson_path = tmp_path / "catalog.ndjson"
+    ndjson_path.write_text(
+        "\n".join(json.dumps(item) for item in items[:10] + [{"quote": "Only in ndjson", "speaker": "Line"}]),
+        encoding="utf-8",
+    )
+
+    stats = ingest_quotes(db, str(json_path), origin="catalog", batch_size=250)
+    assert stats == dict(stats, read=1202, inserted=1200, duplicates=1, skipped=1)
+    assert stats["rowsPerSecond"] > 0
+    again = ingest_quotes(db, str(ndjson_path), origin="catalog")
+    assert again["inserted"] == 1
+    assert db.query(Quote).filter(Quote.origin == "catalog").count() == 1201
+
+
+def test_photo_import_is_incremental(db, tmp_path):
+    from PIL import Image
+
+    from app.models import Photo
+    from app.photos import import_photo_directory
+
+    (tmp_path / "nested").mkdir()
+    Image.new("RGB", (40, 30), (10, 20, 30)).save(tmp_path / "quiet-harbor-unsplash.jpg")
+    Image.new("RGB", (20, 50), (200, 20, 30)).save(tmp_path / "nested" / "red-canyon-42-unsplash.png")
+    (tmp_path / "notes.txt").write_text("not a photo")
+
+    first = import_photo_directory(db, str(tmp_path), origin="import_test", base_dir=str(tmp_path), workers=2)
+    assert (first["scanned"], first["inserted"], first["updated"]) == (2, 2, 0)
+    photos = dict((photo.storage_key, photo) for photo in db.query(Photo).filter(Photo.origin == "import_test"))
+    canyon = photos["nested/red-canyon-42-unsplash.png"]
+    assert (canyon.width, canyon.height, canyon.source_label) == (20, 50, "Red Canyon")
+    assert canyon.byte_size > 0 and len(canyon.content_hash) == 64
+    assert canyon.placeholder.startswith("data:image/jpeg")
+
+    second = import_photo_directory(db, str(tmp_path), origin="import_test", base_dir=str(tmp_path))
+    assert (second["inserted"], second["updated"], second["unchanged"]) == (0, 0, 2)
+    top_level = import_photo_directory(db, str(tmp_path), origin="import_test", base_dir=str(tmp_path), recursive=False)
+    assert (top_level["scanned"], top_level["unchanged"]) == (1, 1)
+
+    Image.new("RGB", (60, 30), (0, 0, 0)).save(tmp_path / "quiet-harbor-unsplash.jpg")
+    third = import_photo_directory(db, str(tmp_path), origin="import_test", base_dir=str(tmp_path))
+    assert (third["inserted"], third["updated"]) == (0, 1)
+    db.expire_all()
+    harbor = db.query(Photo).filter(Photo.storage_key == "quiet-harbor-unsplash.jpg").one()
+    assert harbor.width == 60
+
+
+def test_quote_recommendations_follow_task_text(client):
+    from app.recommend import QuoteIndex
+
+    index = QuoteIndex()
+    index.add(1, "Ship the product before it is perfect", "work")
+    index.add(2, "Rest is part of the training plan", "health")
+    index.add(3, "Private product note", "custom", origin="user_input")
+    assert [item[0] for item in index.search("ship product mvp", limit=2)] == [1]
+    assert [item[0] for item in index.search("ship product", limit=2, allowed_private_ids={3})] == [1, 3]
+    assert index.search("", limit=2) == []
+
+    login(client)
+    target = client.get("/assets/quotes").json()["items"][0]
+    response = client.post("/quotes/recommend", json={"texts": [target["text"]], "limit": 3})
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert items and items[0]["text"] == target["text"]
+    assert all("score" in item for item in items)
+
+
+def test_photo_search_ranks_catalog_and_grants_selected_photo(client, tmp_path, monkeypatch):
+    import json
+
+    import app.main
+    import app.photo_search
+    from app.photo_search import LocalPhotoProvider
+
+    def catalog_item(photo_id, description, tags, likes):
+        return {
+            "id": photo_id,
+            "description": description,
+            "width": 4000,
+            "height": 3000,
+            "color": "#204060",
+            "likes": likes,
+            "urls": {"regular": f"https://images.example/{photo_id}.jpg", "thumb": f"https://images.example/{photo_id}-t.jpg"},
+            "links": {"html": f"https://unsplash.com/photos/{photo_id}"},
+            "user": {"name": "Ada Lens", "username": "ada", "links": {"html": "https://unsplash.com/@ada"}},
+            "tags": [{"title": tag} for tag in tags],
+        }
+
+    catalog = tmp_path / "catalog.json"
+    catalog.write_text(json.dumps({"total": 3, "results": [
+        catalog_item("sea-1", "Calm sea at dawn", ["ocean", "sea"], 10),
+        catalog_item("sea-2", "A boat on the sea", ["boat"], 50),
+        catalog_item("forest-1", "Misty forest trail", ["forest"], 99),
+    ]}))
+    provider = LocalPhotoProvider(str(catalog))
+    first_page = provider.search("sea", page=1, per_page=1)
+    assert (first_page["total"], first_page["total_pages"]) == (2, 2)
+    assert first_page["results"][0]["id"] == "sea-1"
+    assert provider.search("sea", page=2, per_page=1)["results"][0]["id"] == "sea-2"
+    assert first_page["results"][0]["user"]["links"]["html"].endswith("utm_medium=referral")
+    assert provider.search("desert")["total"] == 0
+
+    monkeypatch.setattr(app.photo_search, "photo_provider", provider)
+    monkeypatch.setattr(app.main, "photo_provider", provider)
+    login(client)
+    response = client.get("/photos/search", params={"query": "forest"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["results"]] == ["forest-1"]
+
+    cycles = client.get("/cycles").json()["items"]
+    owned_cycle = [item for item in cycles if item["owned"]][0]
+    run_id = client.post("/runs", json={
+        "cycle_blueprint_id": owned_cycle["id"],
+        "cycle_mode": "owned",
+    }).json()["runId"]
+    for node in owned_cycle["focusNodes"]:
+        client.post(
+            f"/runs/{run_id}/focus-complete",
+            json={"focus_order": node["nodeOrder"], "checked_todos": [], "remaining_nottodos": []},
+        )
+    assert client.post(f"/runs/{run_id}/complete").status_code == 200
+    assert client.post(f"/rewards/{run_id}/select-photo", json={"photo_id": "missing"}).status_code == 404
+    response = client.post(f"/rewards/{run_id}/select-photo", json={"photo_id": "forest-1"})
+    assert response.status_code == 200
+    photo = response.json()["photo"]
+    assert photo["url"] == "https://images.example/forest-1.jpg"
+    assert photo["sourceLabel"] == "Photo by Ada Lens on Unsplash"
+    owned_urls = [item["url"] for item in client.get("/assets/photos").json()["items"]]
+    assert "https://images.example/forest-1.jpg" in owned_urls
+
+
+def test_background_jobs_retry_and_report_status(client, db, monkeypatch):
+    from app.jobs import JOB_HANDLERS
+    from app.jobs import enqueue_job
+    from app.jobs import job_handler
+    from app.jobs import run_pending
+
+    monkeypatch.setattr("app.jobs.JOB_HANDLERS", dict(JOB_HANDLERS))
+    calls = []
+
+    @job_handler("test_flaky")
+    def flaky(db, payload):
+        calls.append(payload["value"])
+        if len(calls) == 1:
+            raise RuntimeError("try again")
+
+    job = enqueue_job(db, "test_flaky", {"value": 7}, max_attempts=2)
+    db.commit()
+    assert run_pending() == 1
+    db.refresh(job)
+    assert (job.status, job.attempts) == ("queued", 1)
+    assert "try again" in job.last_error and job.run_after > datetime.utcnow()
+    assert run_pending() == 0
+
+    job.run_after = datetime.utcnow()
+    db.commit()
+    assert run_pending() == 1
+    db.refresh(job)
+    assert (job.status, job.attempts, calls) == ("succeeded", 2, [7, 7])
+
+    login(client)
+    cycles = client.get("/cycles").json()["items"]
+    owned_cycle = [item for item in cycles if item["owned"]][0]
+    run_id = client.post("/runs", json={
+        "cycle_blueprint_id": owned_cycle["id"],
+        "cycle_mode": "owned",
+    }).json()["runId"]
+    for node in owned_cycle["focusNodes"]:
+        client.post(
+            f"/runs/{run_id}/focus-complete",
+            json={"focus_order": node["nodeOrder"], "checked_todos": [], "remaining_nottodos": []},
+        )
+    assert client.post(f"/runs/{run_id}/complete").status_code == 200
+    jobs = client.post(f"/rewards/{run_id}/claim-cycle").json()["jobs"]
+    assert [(item["kind"], item["status"]) for item in jobs] == [
+        ("grant_cycle_assets", "succeeded"),
+        ("collection_thumbnails", "succeeded"),
+    ]
+    assert client.get(f"/jobs/{jobs[0]['id']}").json()["status"] == "succeeded"
+    assert client.get("/jobs/999999").status_code == 404
+
+
+def test_claimed_cycle_gets_one_mosaic_and_photo_thumbnails(client):
+    from PIL import Image
+
+    login(client)
+    complete_owned_cycle(client)
+    item = client.get("/collection").json()["items"][0]
+    assert item["mosaicUrl"].startswith("/uploads/thumbs/cycle-")
+    mosaic_response = client.get(item["mosaicUrl"])
+    assert mosaic_response.status_code == 200
+    with Image.open(io.BytesIO(mosaic_response.content)) as mosaic:
+        columns = min(len(item["focusNodes"]), 4)
+        assert mosaic.size[0] == columns * 160
+    thumbnails = [node["photo"]["thumbnailUrl"] for node in item["focusNodes"]]
+    assert all(url and url.startswith("/uploads/thumbs/photo-") for url in thumbnails)
+    assert client.get(thumbnails[0]).status_code == 200
+
+
+def test_unreadable_upload_falls_back_to_dominant_color_tile(db, tmp_path, monkeypatch):
+    from PIL import Image
+
+    from app import photos
+    from app.models import Photo
+
+    monkeypatch.setattr(photos, "UPLOAD_DIR", str(tmp_path))
+    (tmp_path / "notes.txt").write_text("not an image")
+    photo = Photo(
+        origin="user_upload",
+        storage_key="notes.txt",
+        source_label="Upload",
+        content_hash="0" * 64,
+        dominant_color="#336699",
+    )
+    db.add(photo)
+    db.flush()
+    assert photos.ensure_photo_thumbnail(photo) is None and photo.thumbnail_key is None
+    key = photos.build_mosaic([photo], "thumbs/cycle-test.jpg")
+    assert sorted(path.name for path in (tmp_path / "thumbs").iterdir()) == ["cycle-test.jpg"]
+    with Image.open(tmp_path / key) as mosaic:
+        red, green, blue = mosaic.getpixel((80, 80))
+        assert abs(red - 0x33) < 8 and abs(green - 0x66) < 8 and abs(blue - 0x99) < 8
+
+
+@pytest.mark.skipif(PROFILING_ENABLED, reason="checks the default build")
+def test_profiling_is_absent_from_the_default_build(client):
+    login(client)
+    response = client.get("/dashboard/summary", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers and "server-timing" not in response.headers
+    for path in ["/admin/profiles", "/admin/profiles/missing", "/admin/profiling/stacks"]:
+        assert client.get(path).status_code == 404
+
+
+@pytest.mark.skipif(PROFILING_ENABLED, reason="already running the profiling build")
+def test_profiling_build_runs_in_its_own_process():
+    import os
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [
+            sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+            "{}::test_admin_profiling_captures_requests_and_stacks".format(__file__),
+        ],
+        env=dict(os.environ, PROFILING_ENABLED="1"),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "1 passed" in result.stdout
+
+
+@pytest.mark.skipif(not PROFILING_ENABLED, reason="needs PROFILING_ENABLED=1 at import time")
+def test_admin_profiling_captures_requests_and_stacks(client, monkeypatch):
+    import pstats
+    import tempfile
+    import threading
+
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from app.database import engine
+    from app.profiling import statements_in_flight
+
+    login(client)
+    profiled = client.get("/dashboard/summary", headers={"X-Profile": "1"})
+    assert profiled.status_code == 200
+    assert "x-profile-id" not in client.get("/dashboard/summary").headers
+    assert "sql;dur=" in profiled.headers["server-timing"]
+    profile_id = profiled.headers["x-profile-id"]
+    listed = client.get("/admin/profiles").json()["items"]
+    assert listed[0]["id"] == profile_id and listed[0]["path"] == "/dashboard/summary"
+    report = client.get(f"/admin/profiles/{profile_id}").text
+    assert "build_dashboard_summary" in report
+    assert "Slowest SQL statements" in report and "focus_daily_counts" in report
+    dump = client.get(f"/admin/profiles/{profile_id}", params={"format": "pstats"})
+    with tempfile.NamedTemporaryFile(suffix=".prof") as handle:
+        handle.write(dump.content)
+        handle.flush()
+        assert pstats.Stats(handle.name).total_calls > 0
+
+    stacks = client.get("/admin/profiling/stacks", params={"seconds": 0.1, "interval_ms": 10})
+    assert stacks.status_code == 200
+    lines = stacks.text.strip().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    monkeypatch.setattr("app.main.ADMIN_EMAILS", set())
+    assert client.get("/admin/profiles").status_code == 403
+    assert "x-profile-id" not in client.get("/dashboard/summary", headers={"X-Profile": "1"}).headers
+
+    with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM no_such_table"))
+        assert threading.get_ident() not in statements_in_flight
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_reads_use_replica_only_past_the_users_write_watermark(client, tmp_path, monkeypatch):
+    import sqlite3
+    import time
+
+    from sqlalchemy import event
+
+    import app.replica
+    from app.cache import cache
+    from app.cache import user_namespace
+    from app.database import ReplicaSessionLocal
+    from app.database import build_engine
+    from app.database import engine
+    from app.replica import mark_replica_synced
+    from app.replica import replica_sync_state
+
+    login(client)
+    complete_owned_cycle(client)
+    replica_path = tmp_path / "replica.db"
+    target = sqlite3.connect(str(replica_path))
+    engine.raw_connection().connection.backup(target)
+    mark_replica_synced(target, time.time())
+    complete_owned_cycle(client)
+    cycles = client.get("/cycles").json()["items"]
+    trial_cycle = [item for item in cycles if item["trialAvailable"]][0]
+    trial_run_id = client.post("/runs", json={"cycle_blueprint_id": trial_cycle["id"], "cycle_mode": "trial"}).json()["runId"]
+    for node in trial_cycle["focusNodes"]:
+        client.post(f"/runs/{trial_run_id}/focus-complete", json={
+            "focus_order": node["nodeOrder"],
+            "checked_todos": [],
+            "remaining_nottodos": [],
+        })
+    client.post(f"/runs/{trial_run_id}/complete")
+    assert client.post(f"/rewards/{trial_run_id}/claim-cycle").status_code == 200
+
+    replica_engine = build_engine("sqlite:///{}".format(replica_path))
+    monkeypatch.setattr(app.replica, "replica_engine", replica_engine)
+    ReplicaSessionLocal.configure(bind=replica_engine)
+    try:
+        cache.clear()
+        focus_total = 8 + len(trial_cycle["focusNodes"])
+        assert client.get("/dashboard/summary").json()["focusCount"] == focus_total
+        assert len(client.get("/collection").json()["items"]) == 3
+
+        mark_replica_synced(target, time.time() + 60)
+        cache.clear()
+        replica_sync_state["checked_at"] = None
+        assert client.get("/dashboard/summary").json()["focusCount"] == 4
+        cache.invalidate(user_namespace("dashboard", client.get("/me").json()["id"]))
+        statements = []
+
+        def record(connection, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            assert client.get("/dashboard/summary").json()["focusCount"] == 4
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert not any("background_jobs" in statement for statement in statements)
+        assert len(client.get("/collection").json()["items"]) == 1
+        cycles = dict((item["id"], item) for item in client.get("/cycles").json()["items"])
+        assert cycles[trial_cycle["id"]]["owned"]
+        assert client.post("/runs", json={"cycle_blueprint_id": trial_cycle["id"], "cycle_mode": "owned"}).status_code == 200
+
+        mark_replica_synced(target, 0)
+        replica_sync_state["checked_at"] = None
+        assert client.get("/dashboard/summary").json()["focusCount"] == focus_total
+        assert len(client.get("/collection").json()["items"]) == 3
+    finally:
+        target.close()
+        replica_sync_state["checked_at"] = None
+        ReplicaSessionLocal.configure(bind=engine)
+        replica_engine.dispose()
+
+
+def test_admin_analytics_aggregates_match_full_rebuild(client, db):
+    from app.analytics import rebuild_analytics
+    from app.analytics import verify_analytics
+    from app.focus_calendar import local_date_for
+
+    login(client)
+    complete_owned_cycle(client, todos=["ship mvp", "write docs"], nottodos=["social feed"])
+    cycles = client.get("/cycles").json()["items"]
+    trial_cycle = [item for item in cycles if item["trialAvailable"]][0]
+    trial_run_id = client.post("/runs", json={
+        "cycle_blueprint_id": trial_cycle["id"],
+        "cycle_mode": "trial",
+    }).json()["runId"]
+    for node in trial_cycle["focusNodes"]:
+        client.post(f"/runs/{trial_run_id}/focus-complete", json={
+            "focus_order": node["nodeOrder"],
+            "checked_todos": [],
+            "remaining_nottodos": [],
+        })
+    assert client.post(f"/runs/{trial_run_id}/complete").status_code == 200
+    stopped_run_id = client.post("/runs", json={"cycle_blueprint_id": cycles[0]["id"], "cycle_mode": "owned"}).json()["runId"]
+    client.post("/runs", json={"cycle_blueprint_id": cycles[0]["id"], "cycle_mode": "owned"})
+    client.post(f"/runs/{stopped_run_id}/stop")
+
+    response = client.get("/admin/analytics", params={"days": 7})
+    assert response.status_code == 200
+    analytics = response.json()
+    focus_total = 4 + len(trial_cycle["focusNodes"])
+    assert [(day["activeUsers"], day["focusCount"], day["taskCount"]) for day in analytics["dailyActiveFocusers"]] == [
+        (1, focus_total, 12)
+    ]
+    assert analytics["averageTasksPerFocus"] == round(12 / focus_total, 4)
+    assert analytics["trialConversion"] == {"rewards": 1, "claims": 0, "rate": 0.0}
+    blueprints = dict((item["id"], item) for item in analytics["blueprints"])
+    owned = blueprints[cycles[0]["id"]]
+    assert (owned["runsStarted"], owned["runsCompleted"], owned["runsStopped"]) == (3, 1, 1)
+    assert verify_analytics(db) == []
+
+    rebuild_analytics(db)
+    assert client.get("/admin/analytics", params={"days": 7}).json() == analytics
+    assert client.get("/admin/analytics", params={"days": 0}).status_code == 400
+
+    assert client.post("/me/timezone", json={"timezone": "Pacific/Kiritimati"}).status_code == 200
+    complete_owned_cycle(client)
+    kiritimati_day = local_date_for(datetime.utcnow(), "Pacific/Kiritimati")
+    latest = client.get("/admin/analytics", params={"days": 1}).json()
+    assert latest["end"] == kiritimati_day
+    assert [day["date"] for day in latest["dailyActiveFocusers"]] == [kiritimati_day]
+
+
+def test_rate_limiter_separates_budgets_and_sheds_load(client, monkeypatch):
+    from app.ratelimit import rate_limiter
+
+    login(client)
+    monkeypatch.setitem(rate_limiter.budgets, "write", (2, 0.5))
+    monkeypatch.setitem(rate_limiter.budgets, "upload", (1, 0.01))
+    cycle_id = client.get("/cycles").json()["items"][0]["id"]
+    statuses = [
+        client.post("/runs", json={"cycle_blueprint_id": cycle_id, "cycle_mode": "owned"}).status_code
+        for _ in range(3)
+    ]
+    assert statuses == [200, 200, 429]
+    limited = client.post("/runs", json={"cycle_blueprint_id": cycle_id, "cycle_mode": "owned"})
+    assert limited.headers["retry-after"] == "2"
+    assert client.get("/cycles").status_code == 200
+
+    upload = ("photo.jpg", io.BytesIO(b"not checked"), "image/jpeg")
+    assert client.post("/rewards/999/upload-photo", files={"file": upload}).status_code == 404
+    assert client.post("/rewards/999/upload-photo", files={"file": upload}).status_code == 429
+    form_quote = client.post("/rewards/999/add-quote", data={"content": "x"}, files={"extra": ("a.txt", b"")})
+    assert form_quote.status_code == 429
+
+    monkeypatch.setattr(rate_limiter, "max_in_flight", 0)
+    shed = client.get("/cycles")
+    assert (shed.status_code, shed.headers["retry-after"]) == (503, "1")
+    stats = client.get("/admin/rate-limits").json()
+    assert stats["rejections"] == {"rate_limited": {"write": 3, "upload": 1}, "shed": {"read": 1}}
+    assert (stats["inFlight"], stats["writesInFlight"]) == (1, 0)
+
+
+def test_task_items_share_one_vocabulary_row_per_user(client, db):
+    from app.models import FocusTaskRecord
+    from app.models import TaskVocabulary
+    from app.recommend import recent_task_text
+
+    login(client)
+    complete_owned_cycle(client, todos=["ship mvp", " ship mvp ", "write docs"], nottodos=["social feed", ""])
+    complete_owned_cycle(client, todos=["ship mvp"], nottodos=["social feed"])
+    user_id = client.get("/me").json()["id"]
+    vocabulary = [row[0] for row in db.query(TaskVocabulary.content).filter(TaskVocabulary.user_id == user_id)]
+    assert sorted(vocabulary) == ["ship mvp", "social feed", "write docs"]
+    assert db.query(FocusTaskRecord).count() == 4 * 3 + 4 * 2
+    assert recent_task_text(db, user_id, limit=2) == "social feed ship mvp"
+
+
+def test_serve_preloads_once_and_reloads_workers_gracefully(tmp_path):
+    import os
+    import signal
+    import socket
+    import subprocess
+    import sys
+    import time
+
+    import httpx
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": "sqlite:///{}".format(tmp_path / "serve.db"),
+        "CACHE_PATH": str(tmp_path / "cache.db"),
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+    })
+    env.pop("CACHE_BACKEND")
+    log_path = tmp_path / "serve.log"
+
+    def wait_for(predicate):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if predicate():
+                return True
+            time.sleep(0.2)
+        return False
+
+    def answers():
+        try:
+            return httpx.get("http://127.0.0.1:{}/".format(port), timeout=1).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.serve", "--workers", "2", "--port", str(port), "--graceful-timeout", "5"],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            assert wait_for(answers)
+            process.send_signal(signal.SIGHUP)
+            assert wait_for(lambda: log_path.read_text().count("(generation 1)") == 2)
+            assert answers()
+        finally:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+    output = log_path.read_text()
+    assert "cache=sqlite" in output
+    assert output.count("Application startup complete") == 4
+    assert output.count("Finished server process") == 4
+    assert process.returncode == 0
+
+
+def test_job_heartbeat_keeps_live_jobs_from_being_requeued(db, monkeypatch):
+    from app.jobs import JobHeartbeat
+    from app.jobs import JobQueue
+    from app.jobs import enqueue_job
+
+    stale = datetime.utcnow() - timedelta(hours=1)
+    live = enqueue_job(db, "grant_cycle_assets", {})
+    orphan = enqueue_job(db, "collection_thumbnails", {})
+    for job in (live, orphan):
+        job.status, job.locked_at = "running", stale
+    db.commit()
+
+    heartbeat = JobHeartbeat()
+    monkeypatch.setattr(heartbeat, "track", lambda job_id: heartbeat._job_ids.add(job_id))
+    heartbeat.track(live.id)
+    assert heartbeat.beat() == 1
+
+    queue = JobQueue(mode="threads")
+    queue.requeue_if_due()
+    db.refresh(orphan)
+    assert orphan.status == "running"
+
+    monkeypatch.setattr("app.jobs.REQUEUE_INTERVAL_SECONDS", 0)
+    queue.requeue_if_due()
+    db.refresh(live)
+    db.refresh(orphan)
+    assert (live.status, orphan.status) == ("running", "queued")
@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timedelta
+
+import pytest
+from factories import seed_focus_history
+
+
+@contextmanager
+def recorded_statements():
+    from sqlalchemy import event
+
+    from app.database import engine
+
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_factory_seeds_thousands_of_runs_quickly(db):
+    from app.models import FocusCompletionRecord
+    from app.models import FocusDailyCount
+
+    with recorded_statements() as statements:
+        seeded = seed_focus_history(db, users=2000, runs_per_user=2)
+    assert (len(seeded["userIds"]), seeded["runs"]) == (2000, 4000)
+    assert db.query(FocusCompletionRecord).count() >= seeded["records"]
+    total = sum(row[0] for row in db.query(FocusDailyCount.focus_count).filter(
+        FocusDailyCount.user_id.in_(seeded["userIds"][:100])
+    ))
+    assert total == 100 * 2 * seeded["records"] // seeded["runs"]
+    assert len(statements) < 50
+
+
+def test_dashboard_and_calendar_stay_fast_with_large_history(db):
+    from app.focus_calendar import calendar_buckets
+    from app.main import build_dashboard_summary
+    from app.models import User
+
+    seeded = seed_focus_history(db, users=1500, runs_per_user=4, days=120)
+    user = db.query(User).get(seeded["userIds"][-1])
+    today = datetime.utcnow().date()
+
+    with recorded_statements() as summary_statements:
+        summary = build_dashboard_summary(db, user)
+    with recorded_statements() as calendar_statements:
+        buckets = calendar_buckets(db, user.id, today - timedelta(days=364), today)
+    assert summary["focusCount"] == seeded["records"] // len(seeded["userIds"])
+    assert buckets["total"] == summary["focusCount"]
+    assert len(summary_statements) == 5
+    assert len(calendar_statements) == 1 and "focus_daily_counts" in calendar_statements[0]
+
+
+def test_admin_analytics_reads_aggregates_not_history(db):
+    from app.analytics import analytics_overview
+    from app.analytics import verify_analytics
+
+    seeded = seed_focus_history(db, users=1500, runs_per_user=4, days=120)
+    with recorded_statements() as statements:
+        analytics = analytics_overview(db, days=121)
+    assert len(statements) == 3
+    assert not any("focus_completion_records" in statement or "cycle_runs" in statement for statement in statements)
+    assert sum(day["focusCount"] for day in analytics["dailyActiveFocusers"]) == seeded["records"]
+    assert sum(item["runsCompleted"] for item in analytics["blueprints"]) == seeded["runs"]
+    assert verify_analytics(db) == []
+
+
+def database_bytes(db) -> int:
+    from sqlalchemy import text
+
+    db.execute(text("VACUUM"))
+    return db.execute(text("PRAGMA page_count")).scalar() * db.execute(text("PRAGMA page_size")).scalar()
+
+
+def test_task_vocabulary_compacts_legacy_rows_and_inserts_in_bulk(db):
+    from sqlalchemy import text
+
+    from app.database import engine
+    from app.main import parse_task_items
+    from app.models import CycleRun
+    from app.models import FocusCompletionRecord
+    from app.recommend import recent_task_text
+    from app.task_vocabulary import add_task_records
+    from app.task_vocabulary import TaskCompactionError
+    from app.task_vocabulary import compact_task_records
+    from app.task_vocabulary import needs_task_compaction
+
+    seeded = seed_focus_history(db, users=200, runs_per_user=30, tasks_per_focus=4)
+    user_id = seeded["userIds"][0]
+    expected = recent_task_text(db, user_id)
+    db.execute(text("ALTER TABLE focus_task_records ADD COLUMN content TEXT NOT NULL DEFAULT ''"))
+    db.execute(text(
+        "UPDATE focus_task_records SET content = (SELECT content FROM task_vocabulary WHERE id = task_id), "
+        "task_id = NULL"
+    ))
+    db.execute(text("DELETE FROM task_vocabulary"))
+    db.execute(text(
+        "INSERT INTO focus_task_records (focus_completion_record_id, task_type, content) VALUES (0, 'todo', 'orphan')"
+    ))
+    db.commit()
+    with pytest.raises(TaskCompactionError):
+        compact_task_records(engine)
+    assert needs_task_compaction(engine)
+    db.execute(text("DELETE FROM focus_task_records WHERE focus_completion_record_id = 0"))
+    db.commit()
+    legacy_bytes = database_bytes(db)
+    with recorded_statements() as statements:
+        assert compact_task_records(engine)
+    assert not needs_task_compaction(engine)
+    assert sum(statement.lstrip().upper().startswith(("INSERT", "UPDATE")) for statement in statements) == 2
+    assert recent_task_text(db, user_id) == expected
+    compact_bytes = database_bytes(db)
+    assert compact_bytes < legacy_bytes * 0.95
+
+    items = ["task {}".format(index) for index in range(20000)]
+    assert parse_task_items(items + items) == items
+
+    record_id = db.query(FocusCompletionRecord.id).join(CycleRun, FocusCompletionRecord.run_id == CycleRun.id).filter(
+        CycleRun.user_id == user_id
+    ).first()[0]
+    for index in range(500):
+        with recorded_statements() as statements:
+            add_task_records(db, record_id, user_id, {
+                "todo": ["ship mvp", "write report", "task {}".format(index)],
+                "nottodo": ["social feed", "news sites"],
+            })
+        assert len(statements) <= 4
+    db.commit()
+    assert recent_task_text(db, user_id, limit=5) == "news sites social feed task 499 write report ship mvp"
+    with recorded_statements() as statements:
+        add_task_records(db, record_id, user_id, {"todo": ["bulk {}".format(index) for index in range(400)]})
+    assert len(statements) == 4
+
+
+def test_archive_drains_large_history_in_batches(db, tmp_path):
+    from app.archive import archive_old_runs
+    from app.archive import create_archive_engine
+
+    seeded = seed_focus_history(db, users=500, runs_per_user=2, now=datetime.utcnow() - timedelta(days=400))
+    archive_engine = create_archive_engine("sqlite:///{}".format(tmp_path / "archive.db"))
+    with recorded_statements() as statements:
+        stats = archive_old_runs(db, archive_engine, older_than_days=180, batch_size=250)
+    assert stats["runsArchived"] == seeded["runs"]
+    assert stats["tasksArchived"] == seeded["tasks"]
+    batches = -(-seeded["runs"] // 250)
+    assert sum(statement.lstrip().startswith("DELETE FROM cycle_runs") for statement in statements) == batches
+    assert len(statements) <= 16 * batches